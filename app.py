@@ -1,12 +1,31 @@
+import os
+import time
+import pandas as pd
 import streamlit as st
-import preprocessor, helper
-import matplotlib.pyplot as plt
-import seaborn as sns
-import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer  # Import VADER for sentiment analysis
-# Initialize VADER Sentiment Analyzer
-nltk.download('vader_lexicon')
-sid = SentimentIntensityAnalyzer()
+import preprocessor, helper, cache, charts, ingest, profiling
+# matplotlib, seaborn, nltk and wordcloud are imported by the sections that need them
+
+# Parsed chats survive reruns and re-uploads; set CHATSENSE_CACHE_DIR to also keep them on disk
+@st.cache_resource
+def get_parse_cache():
+    return cache.ParseCache(directory=os.environ.get("CHATSENSE_CACHE_DIR"))
+
+@st.cache_resource
+def get_chart_cache():
+    return charts.ChartCache()
+
+# Latest parsed state per chat, so a weekly re-export of the same group only parses the new tail
+@st.cache_resource
+def get_chat_store():
+    return ingest.ChatStore()
+
+# Uploads are parsed on a background thread; the script only polls the job for progress
+@st.cache_resource
+def get_upload_worker():
+    return ingest.UploadWorker(get_chat_store())
+
+def parse_upload(data, key, progress):
+    return get_parse_cache().load(data, key=key, parse=lambda f: preprocessor.preprocess_file(f, compact=True, progress=progress.update))
 
 # Set the page layout
 st.set_page_config(page_title="ChatSense", page_icon=":speech_balloon:")
@@ -15,22 +34,46 @@ st.title(":green[WhatsApp] ChatSense 📊")
 st.sidebar.title(":green[Chat] Insights Dashboard 📊")
 
 
-st.sidebar.text("Upload Your Chat Data (Format: DD/MM/YY)")
+# Stage timings of this browser session, recorded only while the panel is switched on
+# (server-wide recording to a file is CHATSENSE_PROFILE's job)
+show_performance = st.sidebar.toggle("Performance", help="Time every parsing, analysis and chart stage")
+recorder = st.session_state.setdefault("profiling_recorder", profiling.Recorder())
+profiling.trace_memory(recorder, show_performance and st.sidebar.checkbox(
+    "Trace memory", help="Peak memory per stage. Slows the whole server down while any session has it on"))
+profiling.use(recorder if show_performance else None)
+
+st.sidebar.text("Upload Your WhatsApp Chat Export (Android or iOS)")
 uploaded_file = st.sidebar.file_uploader("Choose a txt file", type='txt')
 if uploaded_file is not None:
-    bytes_data = uploaded_file.getvalue()
-    data = bytes_data.decode("utf-8")
-    df = preprocessor.preprocess(data)
+    job = get_upload_worker().submit(uploaded_file.name, uploaded_file.getvalue(), parse=parse_upload)
+    if not job.done():
+        progress_bar = st.sidebar.progress(0.0, text="Reading chat...")
+        while not job.done():
+            progress_bar.progress(job.progress.fraction, text=str(job.progress))
+            time.sleep(0.1)
+        progress_bar.empty()
+    state = job.result()
+    key, df, index = state.key, state.df, state.index
     st.sidebar.info("Chat Data Uploaded Successfully!!", icon="📁")
+    if df.attrs.get("dropped_rows"):
+        st.sidebar.warning(f"{df.attrs['dropped_rows']} messages with unreadable timestamps were skipped.")
     
     # fetch unique users
-    user_list = df['user'].unique().tolist()
-    user_list.sort()
-    user_list.insert(0, "Overall")
+    user_list = ["Overall"] + index.users
     selected_user = st.sidebar.selectbox("Select User for Analysis", user_list)
     
+    native_charts = st.sidebar.checkbox("Use native charts", help="Draw bar and line charts with Streamlit instead of matplotlib images")
+
     if st.sidebar.button("Show Analysis"):
-        first_date, last_date, chatted_for_days = helper.start_end_date(selected_user, df)
+        chart_cache = get_chart_cache()
+
+        def show_chart(name, draw):
+            # Rendered once per (chat, user, chart) and served from the cache afterwards
+            with profiling.stage(f"chart:{name}"):
+                image = chart_cache.render((key, selected_user, name), draw)
+            st.image(image, width="stretch")
+
+        first_date, last_date, chatted_for_days = helper.start_end_date(selected_user, index)
         if selected_user == "Overall":
             st.header(f":blue[Overall Analysis] 📈", divider="blue")
         else:
@@ -47,7 +90,7 @@ if uploaded_file is not None:
             st.title(f"{last_date}")
         
         st.header(":blue[Top Statistics] 👀", divider="blue")
-        num_messages, words, num_media_msgs, num_links = helper.fetch_stats(selected_user, df)
+        num_messages, words, num_media_msgs, num_links = helper.fetch_stats(selected_user, index)
         
         col1, col2, col3, col4 = st.columns(4)
         
@@ -67,42 +110,38 @@ if uploaded_file is not None:
         # finding the busiest user in the group (Group Level)
         if selected_user == "Overall":
             st.header(":blue[Most Active User in Chats 👑]", divider="blue")
-            x, new_df = helper.most_busy_user(df)
+            x, new_df = helper.most_busy_user(index)
             
             col1, col2 = st.columns([2, 1])
             
             with col1:
-                fig, ax = plt.subplots()
-                ax.bar(x.index, x.values, color='lightblue')
-                if len(user_list) > 5:
-                    plt.xticks(rotation='vertical')
-                ax.set_ylabel('Message Count', fontsize=12)
-                helper.style_plot(ax, fig)
-                st.pyplot(fig)
+                if native_charts:
+                    st.bar_chart(x, sort=False)  # keep the by-count order, not Vega's alphabetical one
+                else:
+                    show_chart("most_busy_user", lambda: charts.bar(x, 'lightblue', rotate=len(user_list) > 5))
             with col2:
                 st.dataframe(new_df)
         
 
         # Monthly Messaging Trends
-        monthly_timeline = helper.monthly_timeline(selected_user, df)
+        monthly_timeline = helper.monthly_timeline(selected_user, index)
         st.header(":blue[Monthly Messaging Trends 📅]", divider='blue')
-        fig, ax = plt.subplots(figsize=(8, 4))
-        ax.plot(monthly_timeline['time'], monthly_timeline['message'], color='lightblue')
-        if len(monthly_timeline['time']) > 5:
-            plt.xticks(rotation='vertical')
-        ax.set_ylabel('Message Count', fontsize=12)
-        helper.style_plot(ax, fig)
-        st.pyplot(fig)
+        if native_charts:
+            # the "January-2021" labels would be sorted alphabetically, so plot against the first of each month
+            month_start = pd.to_datetime(dict(year=monthly_timeline['year'], month=monthly_timeline['month_num'], day=1))
+            st.line_chart(monthly_timeline.assign(time=month_start), x='time', y='message')
+        else:
+            show_chart("monthly_timeline", lambda: charts.line(
+                monthly_timeline['time'], monthly_timeline['message'], rotate=len(monthly_timeline['time']) > 5
+            ))
 
         # Daily Message Trends
-        daily_timeline = helper.daily_timeline(selected_user, df)
+        daily_timeline = helper.daily_timeline(selected_user, index)
         st.header(":blue[Daily Message Trends 📈]", divider='blue')
-        fig, ax = plt.subplots(figsize=(8, 4))
-        ax.plot(daily_timeline['date'], daily_timeline['message'], color='lightblue')
-        plt.xticks(rotation='vertical')
-        ax.set_ylabel('Message Count', fontsize=12)
-        helper.style_plot(ax, fig)
-        st.pyplot(fig)
+        if native_charts:
+            st.line_chart(daily_timeline, x='date', y='message')
+        else:
+            show_chart("daily_timeline", lambda: charts.line(daily_timeline['date'], daily_timeline['message']))
 
         # Chat Activity Heatmap
         st.header(":blue[Chat Activity 📊]", divider='blue')
@@ -110,54 +149,37 @@ if uploaded_file is not None:
         
         with col1:
             st.subheader("Peak Day of the Week 📅")
-            busy_day = helper.week_activity_map(selected_user, df)
-            fig, ax = plt.subplots()
-            ax.bar(busy_day.index, busy_day.values, color='lightblue')
-            plt.xticks(rotation='vertical')
-            ax.set_ylabel("Message Count", fontsize=12)
-            helper.style_plot(ax, fig)
-            st.pyplot(fig)
+            busy_day = helper.week_activity_map(selected_user, index)
+            if native_charts:
+                st.bar_chart(busy_day, sort=False)
+            else:
+                show_chart("week_activity_map", lambda: charts.bar(busy_day, 'lightblue'))
 
         with col2:
             st.subheader("Peak Month of the Year 📆")
-            busy_month = helper.month_activity_map(selected_user, df)
-            fig, ax = plt.subplots()
-            ax.bar(busy_month.index, busy_month.values, color='lightpink')            
-            plt.xticks(rotation='vertical')
-            ax.set_ylabel("Message Count", fontsize=12)
-            helper.style_plot(ax, fig)
-            st.pyplot(fig)
+            busy_month = helper.month_activity_map(selected_user, index)
+            if native_charts:
+                st.bar_chart(busy_month, color='#ffb6c1', sort=False)
+            else:
+                show_chart("month_activity_map", lambda: charts.bar(busy_month, 'lightpink'))
         
         # word cloud
         st.header(":blue[Word Cloud] ☁️", divider="blue")
         col1, col2 = st.columns([2,1])
         with col1:
             try:
-                wordcloud = helper.create_wordcloud(selected_user, df)
-                fig, ax = plt.subplots(figsize=(10, 5))
-                ax.imshow(wordcloud, interpolation='bilinear')
-                ax.axis("off")  # Turn off axes (no border)
-                fig.patch.set_alpha(0)  # Make the background of the figure transparent
-                st.pyplot(fig)
+                with st.spinner("Counting words..."):
+                    show_chart("wordcloud", lambda: charts.wordcloud(helper.create_wordcloud(selected_user, index)))
             except ValueError as e:
                 if str(e) == "We need at least 1 word to plot a word cloud, got 0.":
                     st.warning("No words found to generate a word cloud. Please check the input data.")
         
         # weekly activity map
         st.header(":blue[Weekly Activity Heatmap 🕒]", divider="blue")
-        user_heatmap = helper.activity_heatmap(selected_user, df)
-        fig, ax = plt.subplots(figsize=(14, 7))
-        ax = sns.heatmap(user_heatmap, cbar=True)
-        color_bar = ax.collections[0].colorbar
-        ax.set_xlabel('Time', fontsize=15)
-        ax.set_ylabel('Weekdays', fontsize=15)
-        helper.style_plot(ax, fig)
-        color_bar.ax.yaxis.label.set_color("black")  # Set color bar label color
-        color_bar.ax.tick_params(colors="black")  # Set color bar tick color
-        st.pyplot(fig)
+        show_chart("activity_heatmap", lambda: charts.heatmap(helper.activity_heatmap(selected_user, index)))
         
         try:
-            emoji_df, sizes, sentiment_count = helper.emoji_helper(selected_user, df)
+            emoji_df, sizes, sentiment_count = helper.emoji_helper(selected_user, index)
             st.header(f":blue[Emoji's Analysis] 👀", divider="blue")
             st.subheader("Count of Emojis Used 🔢")
             st.dataframe(emoji_df.T)
@@ -167,60 +189,45 @@ if uploaded_file is not None:
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Emoji 🆚 Non-Emoji Messages", divider='grey')         
-            fig, ax = plt.subplots()
-
-            ax.pie(
-                sizes, autopct='%1.1f%%', startangle=90, 
-                colors=['#c2a1e1', '#7b5cbf'],
-                textprops={'fontsize': 15}
-            )
-            
-            ax.axis('equal')
-            helper.style_plot(ax, fig)
-            ax.legend(['With Emoji', 'Without Emoji'],frameon=False, labelcolor='black')
-            st.pyplot(fig)
+            show_chart("emoji_ratio", lambda: charts.pie(
+                sizes, ['With Emoji', 'Without Emoji'], colors=['#c2a1e1', '#7b5cbf']
+            ))
         with col2:
             st.subheader("Emoji Sentiment Analysis😁😐😕", divider='grey')
-            sentiment_sizes = list(sentiment_count.values())
-            fig, ax = plt.subplots()
-            ax.pie(sentiment_sizes, autopct='%1.1f%%', startangle=90, colors=['#99ff99', '#66b3ff', '#ff9999'], textprops={'fontsize': 15})
-            ax.axis('equal')
-            helper.style_plot(ax, fig)
-            ax.legend(sentiment_count.keys(),frameon=False, labelcolor='black')
-            st.pyplot(fig)
+            show_chart("emoji_sentiment", lambda: charts.pie(
+                list(sentiment_count.values()), sentiment_count.keys(), colors=['#99ff99', '#66b3ff', '#ff9999']
+            ))
     
         # Sentiment Analysis Section
         st.header(":blue[Text Sentiment Analysis] 😊😐😢", divider="blue")
 
-        # Filter messages for the selected user
-        if selected_user != "Overall":
-            user_df = df[df['user'] == selected_user]
-        else:
-            user_df = df
-
-        # Calculate sentiment scores for each message
-        user_df['sentiment'] = user_df['message'].apply(lambda x: sid.polarity_scores(x)['compound'])
-        user_df['sentiment_label'] = user_df['sentiment'].apply(
-            lambda x: 'Positive' if x > 0.05 else ('Negative' if x < -0.05 else 'Neutral')
-        )
-
-        # Aggregate sentiment counts
-        sentiment_counts = user_df['sentiment_label'].value_counts()
+        # Messages are scored once per chat, per-user counts come from a group-by. Everything above
+        # is already on screen while the first scoring runs
+        with st.spinner("Scoring message sentiment..."):
+            sentiment_counts = helper.sentiment_counts(selected_user, index)
 
         # Plot sentiment distribution as a pie chart
-        fig, ax = plt.subplots()
-        ax.pie(
-            sentiment_counts, autopct='%1.1f%%', startangle=90,
-            colors=['#66b3ff', '#99ff99', '#ff9999'], textprops={'fontsize': 7}
-        )
-
-        ax.axis('equal')
-        helper.style_plot(ax, fig)
-        ax.set_title("Sentiment Distribution", fontsize=6, color='black')  # Add title
-        # Add legend with sentiment labels
-        ax.legend(sentiment_counts.index, frameon=False, labelcolor='black', loc='upper right')
-        st.pyplot(fig)
+        show_chart("sentiment", lambda: charts.pie(
+            sentiment_counts, sentiment_counts.index, colors=['#66b3ff', '#99ff99', '#ff9999'],
+            fontsize=7, title="Sentiment Distribution", legend_loc='upper right'
+        ))
 
         # Display sentiment counts as a dataframe
         st.subheader("Sentiment Counts 🔢")
-        st.dataframe(sentiment_counts)
\ No newline at end of file
+        st.dataframe(sentiment_counts)
+
+if show_performance:
+    st.sidebar.header("Performance")
+    if recorder.records():
+        summary = recorder.summary()
+        if summary["peak_mib"].isna().all():
+            summary = summary.drop(columns="peak_mib")
+            st.sidebar.caption("Switch on Trace memory (or start the server with CHATSENSE_PROFILE) for peak memory.")
+        st.sidebar.dataframe(summary.round(3))
+        st.sidebar.download_button("Download timings (JSON lines)", recorder.to_jsonl(),
+                                   file_name="chatsense-timings.jsonl", mime="application/jsonl")
+    else:
+        st.sidebar.caption("No stages recorded yet, upload a chat or run the analysis.")
+    # process-wide cache counters, shared by every session
+    st.sidebar.subheader("Caches")
+    st.sidebar.dataframe({"parsed chats": get_parse_cache().stats(), "charts": get_chart_cache().stats()})
@@ -0,0 +1,188 @@
+# End-to-end throughput of parse, aggregate and sentiment on synthetic exports, with golden-output
+# checks and stored timing baselines
+# Usage: python benchmarks/bench_e2e.py [--sizes 10000 100000 1000000] [--save-baseline] [--threshold 1.25]
+#        python benchmarks/bench_e2e.py --update-golden   (after an intended change in results)
+import argparse
+import hashlib
+import io
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))
+import preprocessor, helper, cli, ingest
+from synthetic import FORMATS, synthetic_export
+
+SIZES = [10_000, 100_000, 1_000_000]
+SENTIMENT_LIMIT = 100_000  # VADER is timed only up to this many messages
+GOLDEN_SIZE = 2_000
+GOLDEN_DIR = HERE / "golden"
+BASELINE = HERE / "baseline.json"
+THRESHOLD = 1.25  # a stage this many times slower than its baseline counts as a regression
+
+
+def digest(table):
+    # Large tables are compared through a hash of their JSON records
+    records = table.to_json(orient="records", date_format="iso", force_ascii=False)
+    return hashlib.sha256(records.encode("utf-8")).hexdigest()
+
+
+def golden_summary(index, with_sentiment):
+    # What a chat's results are compared on: headline numbers in full, the long tables as digests
+    tables = cli.build_report(index, with_sentiment)
+    summary = {
+        "messages": len(index.df),
+        "dropped_rows": int(index.df.attrs["dropped_rows"]),
+        "users": index.users,
+        "stats": json.loads(tables["stats"].to_json(orient="records", date_format="iso", force_ascii=False)),
+        "top_emojis": helper.emoji_helper("Overall", index)[0].values.tolist(),
+        "emoji_sentiment": helper.emoji_helper("Overall", index)[2],
+        "top_words": [[word, int(count)] for word, count in index.words["Overall"].nlargest(20).items()],
+        "digests": {name: digest(table) for name, table in tables.items() if name not in ("stats", "sentiment")},
+    }
+    if with_sentiment:
+        summary["sentiment"] = {label: int(count) for label, count in index.sentiment["Overall"].items()}
+    return summary
+
+
+def appended_summary(date_format, with_sentiment):
+    # The golden export ingested in two steps, its first half and then the whole of it, so the
+    # second half goes through AnalysisIndex.append instead of a full parse
+    head = synthetic_export(GOLDEN_SIZE // 2, date_format=date_format).encode("utf-8")
+    data = synthetic_export(GOLDEN_SIZE, date_format=date_format).encode("utf-8")
+    state = ingest.ingest(head)
+    assert ingest._appendable(data, state), "the first half is not a prefix the store can append to"
+    # lazily computed tables are merged only if they exist, so build them to check their merge too
+    state.index.words
+    if with_sentiment:
+        state.index.sentiment
+    return golden_summary(ingest.ingest(data, state).index, with_sentiment)
+
+
+def check_golden(with_sentiment, update):
+    # Returns the date-format variants whose results differ from benchmarks/golden, or whose
+    # incrementally ingested results differ from a full parse
+    failed = []
+    for date_format in FORMATS:
+        data = synthetic_export(GOLDEN_SIZE, date_format=date_format).encode("utf-8")
+        index = helper.AnalysisIndex(preprocessor.preprocess_file(io.BytesIO(data), compact=True), sentiment_workers=1)
+        summary = golden_summary(index, with_sentiment)
+        path = GOLDEN_DIR / f"{date_format}.json"
+        if update:
+            GOLDEN_DIR.mkdir(exist_ok=True)
+            path.write_text(json.dumps(summary, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+            continue
+        expected = json.loads(path.read_text(encoding="utf-8"))
+        if not with_sentiment:
+            expected.pop("sentiment", None)
+        mismatched = [key for key in expected if expected[key] != summary.get(key)]
+        if mismatched:
+            failed.append(date_format)
+            print(f"GOLDEN MISMATCH {date_format}: {', '.join(mismatched)}")
+        appended = appended_summary(date_format, with_sentiment)
+        mismatched = [key for key in summary if summary[key] != appended.get(key)]
+        if mismatched:
+            failed.append(f"{date_format} (append)")
+            print(f"APPEND MISMATCH {date_format}: {', '.join(mismatched)}")
+    return failed
+
+
+def aggregate(df):
+    # Index construction plus every helper for "Overall" and each user, as the dashboard would ask
+    index = helper.AnalysisIndex(df, sentiment_workers=1)
+    helper.most_busy_user(index)
+    index.words
+    for user in ["Overall"] + index.users:
+        helper.fetch_stats(user, index)
+        helper.start_end_date(user, index)
+        helper.monthly_timeline(user, index)
+        helper.daily_timeline(user, index)
+        helper.week_activity_map(user, index)
+        helper.month_activity_map(user, index)
+        helper.activity_heatmap(user, index)
+        helper.emoji_helper(user, index)
+    return index
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, date_format, sentiment_limit, repeat):
+    # Best-of-repeat seconds per "<size>/<stage>"
+    timings = {}
+    for n in sizes:
+        data = synthetic_export(n, date_format=date_format).encode("utf-8")
+        for _ in range(repeat):
+            df, parse = timed(preprocessor.preprocess_file, io.BytesIO(data), preprocessor.CHUNK_SIZE, True)
+            index, agg = timed(aggregate, df)
+            stages = {"parse": parse, "aggregate": agg}
+            if n <= sentiment_limit:
+                _, stages["sentiment"] = timed(lambda: index.sentiment)
+            for stage, seconds in stages.items():
+                key = f"{n}/{stage}"
+                timings[key] = min(seconds, timings.get(key, seconds))
+        print(f"{n:>10,} messages  {len(data) / 2**20:8.1f} MiB  " + "  ".join(
+            f"{stage} {timings[f'{n}/{stage}']:7.2f}s ({n / timings[f'{n}/{stage}']:>10,.0f} msg/s)"
+            for stage in ("parse", "aggregate", "sentiment") if f"{n}/{stage}" in timings))
+    return timings
+
+
+def compare(timings, baseline, threshold):
+    # Returns the stages slower than threshold x their baseline
+    slower = []
+    for key, seconds in timings.items():
+        before = baseline["timings"].get(key)
+        if before is None:
+            continue
+        ratio = seconds / before
+        flag = "SLOWER" if ratio > threshold else ""
+        print(f"  {key:<20} {before:8.3f}s -> {seconds:8.3f}s  {ratio:5.2f}x {flag}")
+        if ratio > threshold:
+            slower.append(key)
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark on synthetic exports.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--format", dest="date_format", choices=sorted(FORMATS), default="android")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size, the fastest counts")
+    parser.add_argument("--sentiment-limit", type=int, default=SENTIMENT_LIMIT,
+                        help="largest size to run VADER on (0 skips sentiment and its golden check)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--update-golden", action="store_true", help="rewrite the golden outputs and exit")
+    args = parser.parse_args()
+
+    with_sentiment = args.sentiment_limit > 0
+    failed = check_golden(with_sentiment, args.update_golden)
+    if args.update_golden:
+        print(f"golden outputs written to {GOLDEN_DIR}")
+        return 0
+
+    timings = run(args.sizes, args.date_format, args.sentiment_limit, args.repeat)
+    slower = []
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({
+            "python": platform.python_version(), "machine": platform.machine(), "timings": timings,
+        }, indent=1) + "\n", encoding="utf-8")
+        print(f"baseline saved to {args.baseline}")
+    elif args.baseline.exists():
+        print(f"against {args.baseline} (threshold {args.threshold:.2f}x):")
+        slower = compare(timings, json.loads(args.baseline.read_text(encoding="utf-8")), args.threshold)
+
+    if failed or slower:
+        print(f"{len(failed)} golden mismatches, {len(slower)} slowdowns")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# Compares the old per-row emoji/cleaning closures against preprocessor.scan_messages
+# Usage: python benchmarks/bench_emoji_clean.py [num_messages]
+import re
+import sys
+import time
+from pathlib import Path
+
+import emoji
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import preprocessor
+from synthetic import synthetic_messages
+
+
+def extract_emojis(text):
+    return "".join(char for char in text if char in emoji.EMOJI_DATA)
+
+
+def clean_message(text):
+    cleaned_text = emoji.replace_emoji(text, replace="")
+    cleaned_text = re.sub(r"<media omitted>|<this message was edited>|this message was deleted|null", "", cleaned_text, flags=re.IGNORECASE)
+    cleaned_text = re.sub(r"http\S+|www\S+", "", cleaned_text)
+    cleaned_text = re.sub(r"\s+", " ", cleaned_text).strip()
+    return cleaned_text if cleaned_text else ""
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    messages = synthetic_messages(n)
+
+    start = time.perf_counter()
+    messages.apply(extract_emojis)
+    old_clean = messages.apply(clean_message)
+    old = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_emojis, new_clean = preprocessor.scan_messages(messages)
+    new = time.perf_counter() - start
+
+    # whole sequences as the emoji package finds them (the old per-character check split them)
+    expected = messages.map(lambda text: "".join(e["emoji"] for e in emoji.emoji_list(text)))
+    emoji_mismatches = int((expected != new_emojis).sum())
+    mismatches = int((old_clean != new_clean).sum())
+    print(f"{n:,} messages")
+    print(f"apply closures : {old:.2f}s")
+    print(f"scan_messages  : {new:.2f}s ({old / new:.1f}x)")
+    print(f"emoji mismatches: {emoji_mismatches}, clean_message mismatches: {mismatches}")
+    assert emoji_mismatches == mismatches == 0
+
+
+if __name__ == "__main__":
+    main()
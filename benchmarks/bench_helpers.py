@@ -0,0 +1,60 @@
+# Times AnalysisIndex construction and every dashboard helper at several chat sizes
+# Usage: python benchmarks/bench_helpers.py [num_messages ...] [--sentiment]
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import preprocessor, helper
+from synthetic import synthetic_export
+
+SIZES = [10_000, 100_000, 1_000_000]
+
+HELPERS = {
+    "fetch_stats": helper.fetch_stats,
+    "most_busy_user": lambda user, index: helper.most_busy_user(index),
+    "start_end_date": helper.start_end_date,
+    "monthly_timeline": helper.monthly_timeline,
+    "daily_timeline": helper.daily_timeline,
+    "week_activity_map": helper.week_activity_map,
+    "month_activity_map": helper.month_activity_map,
+    "activity_heatmap": helper.activity_heatmap,
+    "emoji_helper": helper.emoji_helper,
+    # word frequencies only, drawing the image does not depend on chat size
+    "word_frequencies": lambda user, index: index.words,
+}
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def bench(n, with_sentiment):
+    df = preprocessor.preprocess_file(io.StringIO(synthetic_export(n)), compact=True)
+    results = {"AnalysisIndex": timed(helper.AnalysisIndex, df)}
+    index = helper.AnalysisIndex(df, sentiment_workers=1)
+    helpers = dict(HELPERS)
+    if with_sentiment:
+        helpers["sentiment_counts"] = helper.sentiment_counts
+    for name, fn in helpers.items():
+        # first call pays for lazy tables (words, sentiment), later calls and other users are lookups
+        results[name] = timed(fn, "Overall", index)
+        results[name + " (user)"] = timed(fn, index.users[0], index)
+    return results
+
+
+def main():
+    with_sentiment = "--sentiment" in sys.argv
+    sizes = [int(arg) for arg in sys.argv[1:] if not arg.startswith("--")] or SIZES
+    for n in sizes:
+        results = bench(n, with_sentiment)
+        print(f"{n:,} messages")
+        for name, seconds in results.items():
+            print(f"  {name:<28}{seconds * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Cold-start import latency of the modules app.py loads before any chat is uploaded
+# Usage: python benchmarks/bench_import.py [runs]
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+STARTUP = "import preprocessor, helper, cache, sentiment"
+HEAVY = ["matplotlib", "seaborn", "nltk", "wordcloud", "PIL", "urlextract"]
+
+
+def importtime(code):
+    # -X importtime writes "import time: self | cumulative | module" lines (microseconds) to stderr
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nested imports are indented by two spaces per level
+        top_level = not name[1:].startswith(" ")
+        modules.append((int(cumulative), name.strip(), top_level))
+    return modules
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for label, code in [("startup", STARTUP), ("eager heavy imports", STARTUP + ", " + ", ".join(HEAVY))]:
+        totals = []
+        for _ in range(runs):
+            totals.append(sum(us for us, _, top_level in importtime(code) if top_level) / 1000)
+        print(f"{label:<20} median {statistics.median(totals):8.1f} ms over {runs} runs")
+
+    modules = importtime(STARTUP)
+    names = {name for _, name, _ in modules}
+    loaded = [name for name in HEAVY if name in names]
+    print("heavy modules loaded at startup:", ", ".join(loaded) or "none")
+    slowest = sorted((us, name) for us, name, top_level in modules if top_level)[::-1][:10]
+    for us, name in slowest:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
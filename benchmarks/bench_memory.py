@@ -0,0 +1,35 @@
+# Memory usage of the preprocessed frame in the default and compact layouts
+# Usage: python benchmarks/bench_memory.py [num_messages]
+import io
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import preprocessor
+from synthetic import synthetic_export
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    data = synthetic_export(n)
+
+    default = preprocessor.preprocess_file(io.StringIO(data))
+    compact = preprocessor.compact_frame(default)
+
+    report = pd.DataFrame({
+        "default": default.memory_usage(deep=True),
+        "compact": compact.memory_usage(deep=True),
+    })
+    report.loc["total"] = report.sum()
+    print(f"{n:,} messages, source text {len(data.encode('utf-8')) / 2**20:,.1f} MiB")
+    print((report / 2**20).round(2).to_string(header=["default MiB", "compact MiB"]))
+
+    before, after = report.loc["total"]
+    print(f"compact layout is {before / after:.1f}x smaller")
+    assert after < before
+
+
+if __name__ == "__main__":
+    main()
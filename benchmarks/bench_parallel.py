@@ -0,0 +1,43 @@
+# Scaling of preprocessor.preprocess_parallel from 1 to N worker processes on a synthetic export
+# Usage: python benchmarks/bench_parallel.py [size_mb] [max_workers]
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import preprocessor
+from synthetic import synthetic_export, write_export
+
+
+def messages_for(size_mb):
+    # Message count that makes an export of about size_mb, measured on a sample of the same generator
+    sample = 10_000
+    per_message = len(synthetic_export(sample).encode("utf-8")) / sample
+    return max(sample, int(size_mb * 2**20 / per_message))
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "export.txt")
+        write_export(path, messages_for(size_mb))  # streamed line by line, never held in memory
+        print(f"synthetic export: {os.path.getsize(path) / 2**20:,.0f} MiB")
+
+        counts = sorted({2**i for i in range(max_workers.bit_length()) if 2**i <= max_workers} | {max_workers})
+        baseline = None
+        for workers in counts:
+            start = time.perf_counter()
+            df = preprocessor.preprocess_parallel(path, workers=workers, compact=True)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{workers:>3} workers: {elapsed:7.2f}s  {len(df) / elapsed:>12,.0f} messages/sec  "
+                  f"speedup {baseline / elapsed:.2f}x")
+            del df
+
+
+if __name__ == "__main__":
+    main()
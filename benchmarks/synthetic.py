@@ -0,0 +1,117 @@
+# Deterministic synthetic WhatsApp exports: the same options and seed always give the same bytes
+# Usage: python benchmarks/synthetic.py -n 100000 -u 12 --format ios -o chat.txt
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+NAMES = ["Alice", "Bob", "Carol", "Dan", "Eve", "Frank", "Grace", "Heidi", "Ivan", "Judy",
+         "Mallory", "Niaj", "Olivia", "Peggy", "Rupert", "Sybil", "Trent", "Victor", "Walter", "Zoe"]
+WORDS = ["hey", "ok", "haha", "see", "you", "tomorrow", "what", "is", "this", "lol", "nice", "the",
+         "a", "and", "to", "it", "meeting", "dinner", "tonight", "weekend", "photo", "call", "me",
+         "later", "coffee", "thanks", "sure", "no", "yes", "maybe", "we", "should", "go", "11", "null"]
+EMOJIS = ["😂", "❤️", "👍", "👍🏽", "😵‍💫", "🎉", "😭", "🔥", "🙏", "😍", "💔", "🤔", "🇮🇳", "✨", "😅", "1️⃣", "#⃣"]
+LINKS = ["https://example.com/{}", "http://news.example.org/story/{}", "www.example.net/p/{}"]
+PUNCTUATION = [".", ",", "!", "?", "...", ". ok", "e.g.", "(yes)."]
+
+# Header of a message line per date-format variant, as the Android and iOS apps write them
+FORMATS = {
+    "android": lambda t: f"{t:%d/%m/%y}, {t.hour}:{t:%M} - ",
+    "android_us": lambda t: f"{t.month}/{t.day}/{t:%y}, {t.hour % 12 or 12}:{t:%M}\u202f{t:%p} - ",
+    "android_dots": lambda t: f"{t:%d.%m.%y}, {t:%H:%M} - ",
+    "ios": lambda t: f"[{t:%d/%m/%Y}, {t:%H:%M:%S}] ",
+}
+MEDIA = {"ios": "\u200eimage omitted"}  # Android and everything else: "<Media omitted>"
+# Group notifications: iOS attributes them to the group, the text starting with U+200E
+NOTIFICATIONS = {"ios": "Weekend Plans: \u200e{} added {}"}  # everything else: "{} added {}"
+
+
+def generate_lines(messages=10_000, users=8, date_format="android", emoji_rate=0.2, link_rate=0.02,
+                   media_rate=0.03, multiline_rate=0.02, notification_rate=0.005, punctuation_rate=0.3,
+                   seed=0, start=datetime(2021, 1, 1)):
+    # Yields the export line by line. A few users write most messages, timestamps advance
+    # in bursts and quiet gaps, and every rate is a per-message probability
+    if date_format not in FORMATS:
+        raise ValueError(f"Unknown date format {date_format!r}, expected one of {sorted(FORMATS)}")
+    rng = random.Random(seed)
+    header = FORMATS[date_format]
+    names = [NAMES[i % len(NAMES)] + ("" if i < len(NAMES) else f" {i // len(NAMES)}") for i in range(users)]
+    weights = [1 / (rank + 1) for rank in range(users)]
+    media = MEDIA.get(date_format, "<Media omitted>")
+    notification = NOTIFICATIONS.get(date_format, "{} added {}")
+    t = start
+
+    for _ in range(messages):
+        t += timedelta(seconds=rng.randint(5, 300) if rng.random() < 0.7 else rng.randint(600, 86_400))
+        if rng.random() < notification_rate:
+            yield header(t) + notification.format(rng.choice(names), rng.choice(names))
+            continue
+
+        sender = rng.choices(names, weights)[0]
+        text = _message(rng, media, emoji_rate, link_rate, media_rate, punctuation_rate)
+        yield header(t) + f"{sender}: {text}"
+        if text != media and rng.random() < multiline_rate:
+            for _ in range(rng.randint(1, 3)):
+                yield " ".join(rng.choices(WORDS, k=rng.randint(1, 8)))
+
+
+def _message(rng, media, emoji_rate, link_rate, media_rate, punctuation_rate):
+    # One message body: a media placeholder, or words with emojis, a link and sentence punctuation mixed in
+    if rng.random() < media_rate:
+        return media
+    tokens = rng.choices(WORDS, k=rng.randint(1, 14))
+    if rng.random() < emoji_rate:
+        for _ in range(rng.randint(1, 3)):
+            tokens.insert(rng.randrange(len(tokens) + 1), rng.choice(EMOJIS))
+    if rng.random() < link_rate:
+        tokens.append(rng.choice(LINKS).format(rng.randrange(10_000)))
+    text = " ".join(tokens)
+    if rng.random() < punctuation_rate:
+        text += rng.choice(PUNCTUATION)
+    return text
+
+
+def synthetic_messages(messages=10_000, date_format="android", emoji_rate=0.2, link_rate=0.02, media_rate=0.03,
+                       punctuation_rate=0.3, seed=0):
+    # Message bodies alone, for benchmarks of the per-message text helpers
+    rng = random.Random(seed)
+    media = MEDIA.get(date_format, "<Media omitted>")
+    return pd.Series([_message(rng, media, emoji_rate, link_rate, media_rate, punctuation_rate)
+                      for _ in range(messages)])
+
+
+def synthetic_export(messages=10_000, **options):
+    return "\n".join(generate_lines(messages, **options)) + "\n"
+
+
+def write_export(path, messages=10_000, **options):
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for line in generate_lines(messages, **options):
+            f.write(line + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic WhatsApp export.")
+    parser.add_argument("-n", "--messages", type=int, default=10_000)
+    parser.add_argument("-u", "--users", type=int, default=8)
+    parser.add_argument("--format", dest="date_format", choices=sorted(FORMATS), default="android")
+    parser.add_argument("--emoji-rate", type=float, default=0.2)
+    parser.add_argument("--link-rate", type=float, default=0.02)
+    parser.add_argument("--media-rate", type=float, default=0.03)
+    parser.add_argument("--multiline-rate", type=float, default=0.02)
+    parser.add_argument("--notification-rate", type=float, default=0.005)
+    parser.add_argument("--punctuation-rate", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = vars(parser.parse_args())
+    output = args.pop("output")
+    if output:
+        write_export(output, **args)
+    else:
+        sys.stdout.writelines(line + "\n" for line in generate_lines(**args))
+
+
+if __name__ == "__main__":
+    main()
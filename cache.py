@@ -0,0 +1,113 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import profiling
+
+MAX_BYTES = 512 * 1024 * 1024  # in-memory budget for parsed frames
+
+
+def content_key(data):
+    # Identical exports hash to the same key no matter how often they are uploaded
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ParseCache:
+    # Parsed chats keyed by a hash of the uploaded bytes: an in-memory LRU bounded by
+    # max_bytes in front of an optional on-disk Parquet tier in `directory`
+    def __init__(self, max_bytes=MAX_BYTES, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()  # key -> (df, size in bytes)
+        self._size = 0
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def load(self, data, parse, key=None):
+        # Returns (key, df), calling parse(file object) only when neither tier has the chat.
+        # The profiling record of the lookup carries which tier answered and the running counters.
+        # key is content_key(data) if the caller already has it
+        if key is None:
+            key = content_key(data)
+        with profiling.stage("parse_cache") as stage:
+            df, tier = self._lookup(key)
+            if df is None:
+                df = parse(io.BytesIO(data))
+                self.put(key, df)
+            stage.rows = len(df)
+            stage.info.update(cache=tier, **self.stats())
+        return key, df
+
+    def get(self, key):
+        return self._lookup(key)[0]
+
+    def _lookup(self, key):
+        # (df, "memory" | "disk") or (None, "miss")
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return self._frames[key][0], "memory"
+
+        path = self._path(key)
+        if path is not None and os.path.exists(path):
+            df = pd.read_parquet(path)
+            with self._lock:
+                self.disk_hits += 1
+            self._remember(key, df)
+            return df, "disk"
+
+        with self._lock:
+            self.misses += 1
+        return None, "miss"
+
+    def put(self, key, df):
+        self._remember(key, df)
+        path = self._path(key)
+        if path is not None and not os.path.exists(path):
+            # write then rename so a crashed write never leaves a truncated file behind
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._frames),
+                "bytes": self._size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._size = 0
+
+    def _remember(self, key, df):
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            if key in self._frames:
+                self._size -= self._frames.pop(key)[1]
+            if size > self.max_bytes:
+                return  # larger than the whole budget, keep it on disk only
+            self._frames[key] = (df, size)
+            self._size += size
+            # evict least recently used frames until we are back under budget
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._frames.popitem(last=False)
+                self._size -= evicted
+
+    def _path(self, key):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, f"{key}.parquet")
@@ -0,0 +1,124 @@
+import io
+import threading
+from collections import OrderedDict
+
+import helper
+
+MAX_ENTRIES = 256  # rendered PNGs kept per server process
+
+
+def _pyplot():
+    # matplotlib is only imported once the first chart is drawn
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+class ChartCache:
+    # Rendered chart images keyed by (chat hash, user, chart type). Figures are closed right
+    # after rendering, so a long-running server only holds PNG bytes, bounded by max_entries
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, key, draw):
+        # draw() builds and returns a matplotlib figure; it only runs on a cache miss
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return self._images[key]
+
+        image = to_png(draw())
+
+        with self._lock:
+            self.misses += 1
+            self._images[key] = image
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+        return image
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._images),
+                "bytes": sum(len(image) for image in self._images.values()),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+
+
+def to_png(fig):
+    # PNG bytes of a figure, which is closed afterwards
+    try:
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", bbox_inches="tight", dpi=200)
+    finally:
+        _pyplot().close(fig)
+    return buf.getvalue()
+
+
+def bar(series, color, rotate=True):
+    plt = _pyplot()
+    fig, ax = plt.subplots()
+    ax.bar(series.index, series.values, color=color)
+    if rotate:
+        ax.tick_params(axis='x', labelrotation=90)
+    ax.set_ylabel('Message Count', fontsize=12)
+    helper.style_plot(ax, fig)
+    return fig
+
+
+def line(x, y, rotate=True):
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(8, 4))
+    ax.plot(x, y, color='lightblue')
+    if rotate:
+        ax.tick_params(axis='x', labelrotation=90)
+    ax.set_ylabel('Message Count', fontsize=12)
+    helper.style_plot(ax, fig)
+    return fig
+
+
+def heatmap(user_heatmap):
+    plt = _pyplot()
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=(14, 7))
+    ax = sns.heatmap(user_heatmap, cbar=True, ax=ax)
+    color_bar = ax.collections[0].colorbar
+    ax.set_xlabel('Time', fontsize=15)
+    ax.set_ylabel('Weekdays', fontsize=15)
+    helper.style_plot(ax, fig)
+    color_bar.ax.yaxis.label.set_color("black")  # Set color bar label color
+    color_bar.ax.tick_params(colors="black")  # Set color bar tick color
+    return fig
+
+
+def wordcloud(cloud):
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.imshow(cloud, interpolation='bilinear')
+    ax.axis("off")  # Turn off axes (no border)
+    fig.patch.set_alpha(0)  # Make the background of the figure transparent
+    return fig
+
+
+def pie(sizes, labels, colors, fontsize=15, title=None, legend_loc='best'):
+    plt = _pyplot()
+    fig, ax = plt.subplots()
+    ax.pie(sizes, autopct='%1.1f%%', startangle=90, colors=colors, textprops={'fontsize': fontsize})
+    ax.axis('equal')
+    helper.style_plot(ax, fig)
+    if title:
+        ax.set_title(title, fontsize=6, color='black')
+    ax.legend(labels, frameon=False, labelcolor='black', loc=legend_loc)
+    return fig
@@ -0,0 +1,145 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import preprocessor, helper, profiling
+
+
+def find_exports(inputs):
+    # Directories are searched for .txt exports, anything else is treated as a path or glob
+    paths = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*.txt")
+        paths.extend(sorted(glob.glob(pattern, recursive=True)))
+    # the same file reached through two inputs is analyzed once
+    return list({os.path.abspath(path): path for path in paths}.values())
+
+
+def report_names(paths):
+    # Reports mirror the exports' folders below their common parent, so exports with the same
+    # file name in different folders (e.g. nightly dumps) do not overwrite each other
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    return {path: os.path.splitext(os.path.relpath(os.path.abspath(path), root))[0] for path in paths}
+
+
+def build_report(index, sentiment=False):
+    # Long-format tables covering every user plus "Overall"
+    stats = index.stats.join(index.spans)
+    stats.index.name = 'user'
+    tables = {
+        'stats': stats.reset_index(),
+        'daily': pd.concat(index.daily, names=['user']).rename('messages').reset_index(),
+        'monthly': pd.concat(index.monthly, names=['user']).rename('messages').reset_index(),
+        'activity': pd.concat({user: table.stack() for user, table in index.weekday_hour.items()},
+                              names=['user']).rename('messages').reset_index().query('messages > 0'),
+    }
+    if len(index.emojis):
+        tables['emoji'] = index.emojis.to_frame()
+    if sentiment:
+        tables['sentiment'] = pd.concat(index.sentiment, names=['user']).rename('messages').reset_index()
+    return tables
+
+
+def write_report(name, tables, output, fmt):
+    if fmt == 'parquet':
+        directory = os.path.join(output, name)
+        os.makedirs(directory, exist_ok=True)
+        for table, df in tables.items():
+            df.to_parquet(os.path.join(directory, f"{table}.parquet"), index=False)
+    else:
+        os.makedirs(os.path.dirname(os.path.join(output, name)), exist_ok=True)
+        report = {table: json.loads(df.to_json(orient='records', date_format='iso', force_ascii=False))
+                  for table, df in tables.items()}
+        with open(os.path.join(output, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+
+
+def render_charts(name, index, output):
+    # Same figures as the dashboard, written as PNG files
+    import charts
+
+    directory = os.path.join(output, name)
+    os.makedirs(directory, exist_ok=True)
+
+    monthly_timeline = helper.monthly_timeline("Overall", index)
+    daily_timeline = helper.daily_timeline("Overall", index)
+    figures = {
+        "monthly_timeline": lambda: charts.line(monthly_timeline['time'], monthly_timeline['message']),
+        "daily_timeline": lambda: charts.line(daily_timeline['date'], daily_timeline['message']),
+        "activity_heatmap": lambda: charts.heatmap(helper.activity_heatmap("Overall", index)),
+    }
+    for chart, draw in figures.items():
+        with open(os.path.join(directory, f"{chart}.png"), "wb") as f:
+            f.write(charts.to_png(draw()))
+
+
+def process_export(path, name, output, fmt, charts, sentiment):
+    # Runs in a worker process; only a small summary travels back to the parent
+    start = time.perf_counter()
+    try:
+        df = preprocessor.preprocess_file(path, compact=True)
+        # the worker is already one of N processes, so sentiment scoring stays in-process
+        index = helper.AnalysisIndex(df, sentiment_workers=1)
+        write_report(name, build_report(index, sentiment), output, fmt)
+        if charts:
+            render_charts(name, index, output)
+    except Exception as e:
+        return {"path": path, "messages": 0, "dropped_rows": 0, "seconds": time.perf_counter() - start,
+                "error": f"{type(e).__name__}: {e}"}
+    return {"path": path, "messages": len(df), "dropped_rows": df.attrs["dropped_rows"],
+            "seconds": time.perf_counter() - start, "error": None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze WhatsApp chat exports without the dashboard.")
+    parser.add_argument("inputs", nargs="+", help="export files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default="reports", help="output directory (default: reports)")
+    parser.add_argument("-f", "--format", choices=["json", "parquet"], default="json")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--max-tasks-per-child", type=int, default=8,
+                        help="recycle a worker after this many chats to bound its memory")
+    parser.add_argument("--charts", action="store_true", help="also render PNG charts per chat")
+    parser.add_argument("--sentiment", action="store_true", help="include VADER sentiment counts")
+    parser.add_argument("--profile", metavar="PATH", help="append per-stage timings to PATH as JSON lines")
+    args = parser.parse_args(argv)
+    if args.profile:
+        # workers inherit the setting, whether they are forked or re-import profiling
+        os.environ[profiling.ENV] = args.profile
+        profiling.enable(args.profile)
+
+    paths = find_exports(args.inputs)
+    if not paths:
+        parser.error("no .txt exports found")
+    os.makedirs(args.output, exist_ok=True)
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers, max_tasks_per_child=args.max_tasks_per_child) as pool:
+        futures = [pool.submit(process_export, path, name, args.output, args.format, args.charts, args.sentiment)
+                   for path, name in report_names(paths).items()]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result["error"]:
+                print(f"FAILED {result['path']}: {result['error']}", file=sys.stderr)
+            elif result["dropped_rows"]:
+                print(f"{result['path']}: skipped {result['dropped_rows']} messages with unreadable timestamps",
+                      file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    done = [r for r in results if not r["error"]]
+    messages = sum(r["messages"] for r in done)
+    print(f"{len(done)}/{len(paths)} chats, {messages:,} messages in {elapsed:.2f}s "
+          f"({len(done) / elapsed:.2f} chats/sec, {messages / elapsed:,.0f} messages/sec)")
+    return 1 if len(done) < len(paths) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
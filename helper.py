@@ -1,11 +1,72 @@
+import copy
+import functools
+import types
 import numpy as np
 import pandas as pd
-from urlextract import URLExtract
-from wordcloud import WordCloud
-from PIL import Image, ImageOps  # ImageOps to invert the mask
-from collections import Counter
+from preprocessor import EMOJI_PATTERN, DAYS, get_format
+from query import MessageFilter, TimeIndex
+import profiling
+import sentiment
 
-extractor = URLExtract()
+# URLExtract loads its TLD list on construction, so it is only imported and created once links are counted
+_extractor = None
+
+# A URL needs a dot between word characters before its TLD (or a scheme); everything else,
+# including sentences that just end with a period, is skipped
+LINK_CANDIDATE = r"\w\.\w|://"
+
+# Heatmap column labels: hour h is shown as "h-(h+1)", the last hour wraps to "23-00"
+PERIODS = [f"{hour}-{hour + 1}" for hour in range(23)] + ["23-00"]
+
+# Sentiment of common emojis; anything not listed counts as neutral
+EMOJI_SENTIMENT = types.MappingProxyType({
+    # Positive emojis
+    "😀": "positive", "😃": "positive", "😄": "positive", "😁": "positive", "😆": "positive", "😅": "positive",
+    "😂": "positive", "🤣": "positive", "😊": "positive", "😇": "positive", "😍": "positive", "😘": "positive",
+    "😚": "positive", "😋": "positive", "😜": "positive", "😎": "positive", "🤩": "positive", "🥳": "positive",
+    "🤗": "positive", "💖": "positive", "💓": "positive", "💕": "positive", "💞": "positive", "💝": "positive",
+    "💙": "positive", "💚": "positive", "💛": "positive", "💜": "positive", "❤️": "positive", "🧡": "positive",
+    "💗": "positive", "🎉": "positive", "🎊": "positive", "🥰": "positive", "😻": "positive", "👍": "positive",
+    "🙏": "positive", "✨": "positive", "🌟": "positive", "🥹": "positive", "🔥": "positive", "💪": "positive",
+    "🦄": "positive", "🌻": "positive", "🌼": "positive", "🍀": "positive", "🎈": "positive",
+    "🍰": "positive", "💌": "positive", "🧁": "positive", "☀️": "positive", "🌊": "positive", "🥲": "positive",
+
+    # Negative emojis
+    "😞": "negative", "😔": "negative", "😟": "negative", "😕": "negative", "🙁": "negative", "☹️": "negative",
+    "😣": "negative", "😖": "negative", "😫": "negative", "😩": "negative", "😭": "negative", "😢": "negative",
+    "😨": "negative", "😰": "negative", "😱": "negative", "😡": "negative", "😠": "negative", "🤬": "negative",
+    "👿": "negative", "😤": "negative", "😓": "negative", "🤒": "negative", "🤕": "negative", "🥵": "negative",
+    "🥶": "negative", "😳": "negative", "💔": "negative", "💀": "negative", "☠️": "negative",
+    "👎": "negative", "😵": "negative", "😧": "negative", "🤢": "negative", "🤮": "negative", "🤧": "negative",
+    "😬": "negative", "😵‍💫": "negative", "🥺": "negative", "🖤": "negative",
+    "💩": "negative", "😿": "negative",
+})
+SENTIMENTS = ["positive", "neutral", "negative"]
+TOP_EMOJIS = 51
+
+MAX_QUERIES = 16  # filtered indexes kept per AnalysisIndex
+# Per-message counts kept on every AnalysisIndex, in the order of its stats columns after "messages"
+MESSAGE_COUNT_DTYPES = {'words': 'int32', 'media': 'bool', 'links': 'int32', 'emoji_messages': 'bool'}
+
+# Same tokens WordCloud.generate would produce
+WORD_PATTERN = r"\w[\w']*"
+MAX_WORDS = 1000
+
+def get_extractor():
+    global _extractor
+    if _extractor is None:
+        from urlextract import URLExtract
+        _extractor = URLExtract()
+    return _extractor
+
+@profiling.profiled("links", rows=len)
+def count_links(messages):
+    counts = pd.Series(0, index=messages.index, dtype='int64')
+    candidates = messages[messages.str.contains(LINK_CANDIDATE, regex=True)]
+    if not candidates.empty:
+        extractor = get_extractor()
+        counts.loc[candidates.index] = [len(extractor.find_urls(msg)) for msg in candidates]
+    return counts
 
 def style_plot(ax, fig, spine_color='black', tick_color='black', label_color = "black"):
     ax.tick_params(colors=tick_color)  # Set tick color
@@ -18,60 +79,326 @@ def style_plot(ax, fig, spine_color='black', tick_color='black', label_color = "
     ax.yaxis.label.set_color(label_color)
 
 
-def fetch_stats(selected_user, df):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user]
-    # fetch the number of messages
-    num_messages = df.shape[0]
+class AnalysisIndex:
+    # Built once per parsed chat: per-user group-by tables keyed by categorical user codes,
+    # so every helper below answers for a user (or "Overall") with a lookup instead of a rescan
+    def __init__(self, df, sentiment_workers=None, message_counts=None, message_emojis=None):
+        # message_counts and message_emojis are the per-message tables built below; query() passes
+        # the slices of its parent's so a subset of the chat is never counted again
+        with profiling.stage("index", rows=len(df)):
+            self.df = df
+            self.sentiment_workers = sentiment_workers
+            user = df['user'].astype('category')
+            self.users = user.cat.categories.tolist()
+            self.user_codes = {name: code for code, name in enumerate(self.users)}
+            self.codes = pd.Series(user.cat.codes, index=df.index, name='user')
+            codes = self.codes
 
-    # fetch the total number of words
-    words = []
-    for msg in df['message']:
-        words.extend(msg.split())
+            # word, media, link and emoji-message counts per message, then message totals per user
+            if message_counts is None:
+                message_counts = pd.DataFrame({
+                    'words': df['message'].str.split().str.len(),
+                    'media': df['message'].str.fullmatch(get_format(df.attrs.get("format", "android")).media),
+                    'links': count_links(df['message']),
+                    'emoji_messages': df['emoji'] != "",
+                }, index=df.index).astype(MESSAGE_COUNT_DTYPES)
+            self.message_counts = message_counts
+            stats = message_counts.assign(messages=1).groupby(codes).sum()[['messages', *MESSAGE_COUNT_DTYPES]]
+            stats.index = [self.users[code] for code in stats.index]
+            stats.loc["Overall"] = stats.sum()
+            self.stats = stats
+
+            # first/last message and number of active days per user
+            day = df['msg_date'].dt.normalize().rename('date')
+            self.daily = self._per_user(df.groupby([codes, day]).size())
+            self.monthly = self._per_user(df.groupby([codes, 'year', 'month_num', 'month'], observed=True).size())
+            self.months = self._per_user(df.groupby([codes, 'month'], observed=True).size())
+
+            # messages per user x weekday x hour from a single bincount over integer codes
+            slots = (codes.to_numpy(dtype='int64') * 7 + df['msg_date'].dt.weekday.to_numpy()) * 24 + df['hour'].to_numpy()
+            cube = np.bincount(slots, minlength=len(self.users) * 7 * 24).reshape(len(self.users), 7, 24)
+            self.weekday_hour = {user: _weekday_hour_frame(cube[code]) for code, user in enumerate(self.users)}
+            self.weekday_hour["Overall"] = _weekday_hour_frame(cube.sum(axis=0))
+
+            spans = df.groupby(codes).agg(first=('msg_date', 'first'), last=('msg_date', 'last'))
+            spans.index = [self.users[code] for code in spans.index]
+            spans.loc["Overall"] = [df['msg_date'].iloc[0], df['msg_date'].iloc[-1]]
+            # number of distinct days is just the length of each daily timeline
+            spans['days'] = [len(self.daily[user]) for user in spans.index]
+            self.spans = spans
+
+            # every emoji occurrence as (row position, emoji)
+            if message_emojis is None:
+                emojis = df['emoji'].str.findall(EMOJI_PATTERN).explode().dropna()
+                message_emojis = (df.index.get_indexer(emojis.index), pd.Categorical(emojis.to_numpy()))
+            self.message_emojis = message_emojis
+            positions, emojis = message_emojis
+            self.emojis = EmojiMatrix(self.users, codes.to_numpy()[positions], np.asarray(emojis))
+            self._sentiment = None
+            self._words = None
+            self._time_index = None
+            self._queries = {}
+
+    @property
+    def sentiment(self):
+        # VADER is the most expensive stage, so messages are only scored the first time it is needed
+        if self._sentiment is None:
+            with profiling.stage("sentiment", rows=len(self.df)):
+                self.sentiment_scores = sentiment.polarity(self.df['message'], self.sentiment_workers)
+            labels = sentiment.labels(self.sentiment_scores)
+            self._sentiment = self._per_user(labels.groupby([self.codes, labels]).size())
+        return self._sentiment
+
+    @property
+    def words(self):
+        # Word cloud frequencies for every user, tokenized in one pass over the chat on first use
+        if self._words is None:
+            with profiling.stage("words", rows=len(self.df)):
+                from wordcloud import STOPWORDS
+                tokens = pd.DataFrame({
+                    'user': self.codes, 'word': self.df['clean_message'].str.lower().str.findall(WORD_PATTERN)
+                }).explode('word').dropna()
+                word = tokens['word'].str.removesuffix("'s")
+                keep = ~word.isin(STOPWORDS) & ~word.str.isdigit()
+                self._words = self._per_user(tokens[keep].groupby(['user', word[keep]]).size())
+        return self._words
+
+    def query(self, flt):
+        # AnalysisIndex over just the messages matching a MessageFilter, cached per filter. Rows come
+        # from binary searches on a time index built on the first query, not from a scan of the chat
+        if flt in self._queries:
+            return self._queries[flt]
+        if self._time_index is None:
+            with profiling.stage("time_index", rows=len(self.df)):
+                self._time_index = TimeIndex(self.df['msg_date'], self.df['hour'], self.codes, len(self.users))
+        with profiling.stage("query") as stage:
+            rows = self._time_index.select(flt, self.user_codes)
+            stage.rows = len(rows)
+        if len(rows) == 0:
+            raise ValueError(f"No messages match {flt}.")
+
+        df = self.df.iloc[rows].reset_index(drop=True)
+        if isinstance(df['user'].dtype, pd.CategoricalDtype):
+            df['user'] = df['user'].cat.remove_unused_categories()
+        # per-message counts and emojis are sliced, not counted again; rows is sorted, so an
+        # emoji's new row position is the number of selected rows before it
+        selected = np.zeros(len(self.df), dtype=bool)
+        selected[rows] = True
+        positions, emojis = self.message_emojis
+        keep = selected[positions]
+        message_emojis = ((np.cumsum(selected) - 1)[positions[keep]], emojis[keep])
+        message_counts = self.message_counts.iloc[rows].reset_index(drop=True)
+        index = AnalysisIndex(df, self.sentiment_workers, message_counts, message_emojis)
+        # reuse message scores if the whole chat was already scored
+        if self._sentiment is not None:
+            index.sentiment_scores = self.sentiment_scores.iloc[rows].reset_index(drop=True)
+            labels = sentiment.labels(index.sentiment_scores)
+            index._sentiment = index._per_user(labels.groupby([index.codes, labels]).size())
+
+        self._queries[flt] = index
+        while len(self._queries) > MAX_QUERIES:
+            self._queries.pop(next(iter(self._queries)))
+        return index
+
+    def append(self, df):
+        # Index over self.df followed by df, merged from the aggregates of both parts
+        # so the rows already indexed are not aggregated again
+        tail = AnalysisIndex(df, self.sentiment_workers)
+        merged = copy.copy(self)
+        merged.df = pd.concat([self.df, df], ignore_index=True)
+        merged.df.attrs = {**self.df.attrs, "dropped_rows": self.df.attrs.get("dropped_rows", 0) + df.attrs.get("dropped_rows", 0)}
+        if isinstance(self.df['user'].dtype, pd.CategoricalDtype):
+            merged.df['user'] = merged.df['user'].astype('category')
+        user = merged.df['user'].astype('category')
+        merged.users = user.cat.categories.tolist()
+        merged.user_codes = {name: code for code, name in enumerate(merged.users)}
+        merged.codes = pd.Series(user.cat.codes, index=merged.df.index, name='user')
+        merged._time_index = None
+        merged._queries = {}
+
+        merged.message_counts = pd.concat([self.message_counts, tail.message_counts], ignore_index=True)
+        merged.message_emojis = (
+            np.concatenate([self.message_emojis[0], tail.message_emojis[0] + len(self.df)]),
+            pd.Categorical(np.concatenate([np.asarray(self.message_emojis[1]), np.asarray(tail.message_emojis[1])])),
+        )
+        merged.stats = self.stats.add(tail.stats, fill_value=0).astype('int64')
+        merged.daily = _merge_counts(self.daily, tail.daily)
+        merged.monthly = _merge_counts(self.monthly, tail.monthly)
+        merged.months = _merge_counts(self.months, tail.months)
+        merged.weekday_hour = _merge_counts(self.weekday_hour, tail.weekday_hour)
+        merged.emojis = self.emojis.merge(tail.emojis, merged.users)
+
+        spans = self.spans.combine_first(tail.spans)
+        spans.loc[tail.spans.index, 'last'] = tail.spans['last']
+        spans['days'] = [len(merged.daily[user]) for user in spans.index]
+        merged.spans = spans
+
+        # lazily computed tables are only carried over if they already exist
+        if self._sentiment is not None:
+            merged._sentiment = _merge_counts(self._sentiment, tail.sentiment)
+            merged.sentiment_scores = pd.concat([self.sentiment_scores, tail.sentiment_scores], ignore_index=True)
+        if self._words is not None:
+            merged._words = _merge_counts(self._words, tail.words)
+        return merged
+
+    def _per_user(self, table):
+        # splits a (user, ...) count table into {user: counts} plus the "Overall" sum
+        parts = {self.users[code]: part.droplevel(0) for code, part in table.groupby(level=0, observed=True)}
+        parts["Overall"] = table.groupby(level=list(range(1, table.index.nlevels)), observed=True).sum()
+        return parts
+
+    def counts(self, table, selected_user):
+        # users without rows in a table (e.g. no emojis) get an empty result
+        empty = pd.Series(dtype='int64', index=table["Overall"].index[:0])
+        return table.get(selected_user, empty)
 
-    # fetch number of media shared
-    num_media_msg = df[df['message'] == '<Media omitted>'].shape[0]
-    
-    # fetch number of links shared
-    links = []
-    for msg in df['message']:
-        links.extend(extractor.find_urls(msg))
 
-    return num_messages, len(words), num_media_msg, len(links)
+class EmojiMatrix:
+    # Sparse user x emoji count matrix in CSR form: user r used emoji indices[k] data[k] times
+    # for k in indptr[r]:indptr[r + 1]. Emoji ids point into vocab, which is sorted, and
+    # sentiment[id] is the emoji's position in SENTIMENTS
+    def __init__(self, users, rows, emojis, counts=None):
+        # rows (user codes) and emojis are parallel arrays, one entry per occurrence unless counts is given
+        self.users = list(users)
+        self.user_codes = {name: code for code, name in enumerate(self.users)}
+        ids, vocab = pd.factorize(pd.Series(emojis, dtype=object), sort=True)
+        self.vocab = np.asarray(vocab, dtype=object)
+        width = max(len(self.vocab), 1)
+        cells, cell = np.unique(np.asarray(rows, dtype='int64') * width + ids, return_inverse=True)
+        weights = None if counts is None else np.asarray(counts, dtype='int64')
+        self.data = np.bincount(cell, weights=weights, minlength=len(cells)).astype('int64')
+        rows, self.indices = np.divmod(cells, width)
+        self.indptr = np.searchsorted(rows, np.arange(len(self.users) + 1))
+        self.totals = np.bincount(self.indices, weights=self.data, minlength=len(self.vocab)).astype('int64')
+        codes = {name: code for code, name in enumerate(SENTIMENTS)}
+        self.sentiment = pd.Series(self.vocab, dtype=object).map(EMOJI_SENTIMENT).map(codes) \
+            .fillna(codes["neutral"]).to_numpy(dtype='int8')
 
-def most_busy_user(df):
-    x = df['user'].value_counts().head()
-    df = round((df['user'].value_counts() / df.shape[0])*100, 2).reset_index().rename(columns={'user': "User", 'count':"Percentage %"})
+    def __len__(self):
+        return len(self.vocab)
+
+    def row(self, selected_user):
+        # (emoji ids, counts) used by a user, or by everyone for "Overall"
+        if selected_user == "Overall":
+            ids = np.flatnonzero(self.totals)
+            return ids, self.totals[ids]
+        code = self.user_codes.get(selected_user)
+        if code is None:
+            return self.indices[:0], self.data[:0]
+        start, end = self.indptr[code], self.indptr[code + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def top(self, selected_user, k):
+        # k most used emojis, ties in vocab order, via a partial selection instead of a full sort
+        ids, counts = self.row(selected_user)
+        if len(counts) > k:
+            kth = np.partition(counts, len(counts) - k)[len(counts) - k]
+            above = np.flatnonzero(counts > kth)
+            ties = np.flatnonzero(counts == kth)[:k - len(above)]
+            keep = np.sort(np.concatenate([above, ties]))
+            ids, counts = ids[keep], counts[keep]
+        order = np.argsort(-counts, kind='stable')
+        return self.vocab[ids[order]], counts[order]
+
+    def sentiment_mix(self, selected_user):
+        ids, counts = self.row(selected_user)
+        mix = np.bincount(self.sentiment[ids], weights=counts, minlength=len(SENTIMENTS))
+        return {label: int(count) for label, count in zip(SENTIMENTS, mix)}
+
+    def merge(self, other, users):
+        # both matrices added together over the merged user list
+        codes = {name: code for code, name in enumerate(users)}
+        rows, emojis, counts = [], [], []
+        for matrix in (self, other):
+            remap = np.array([codes[name] for name in matrix.users], dtype='int64')
+            rows.append(remap[np.repeat(np.arange(len(matrix.users)), np.diff(matrix.indptr))])
+            emojis.append(matrix.vocab[matrix.indices])
+            counts.append(matrix.data)
+        return EmojiMatrix(users, np.concatenate(rows), np.concatenate(emojis), np.concatenate(counts))
+
+    def to_frame(self):
+        # long (user, emoji, count) table, "Overall" last
+        rows = np.repeat(np.arange(len(self.users)), np.diff(self.indptr))
+        ids = np.flatnonzero(self.totals)
+        return pd.DataFrame({
+            'user': [self.users[code] for code in rows] + ["Overall"] * len(ids),
+            'emoji': np.concatenate([self.vocab[self.indices], self.vocab[ids]]),
+            'count': np.concatenate([self.data, self.totals[ids]]),
+        })
+
+
+def _weekday_hour_frame(counts):
+    # 7 x 24 message counts, Monday first
+    return pd.DataFrame(counts, index=pd.Index(DAYS, name='day_name'), columns=pd.RangeIndex(24, name='hour'))
+
+def _merge_counts(table, other):
+    # adds two {user: counts} tables key by key
+    merged = dict(table)
+    for user, counts in other.items():
+        if user in merged:
+            merged[user] = merged[user].add(counts, fill_value=0).astype('int64')
+        else:
+            merged[user] = counts
+    return merged
+
+def _filterable(helper):
+    # Lets a helper take a MessageFilter wherever it takes selected_user; the filter is answered
+    # as "Overall" on the index of just the matching messages
+    @functools.wraps(helper)
+    def wrapper(selected_user, index):
+        if isinstance(selected_user, MessageFilter):
+            index, selected_user = index.query(selected_user), "Overall"
+        with profiling.stage(helper.__name__, rows=len(index.df)):
+            return helper(selected_user, index)
+    return wrapper
+
+@_filterable
+def fetch_stats(selected_user, index):
+    stats = index.stats.loc[selected_user]
+    return int(stats['messages']), int(stats['words']), int(stats['media']), int(stats['links'])
+
+@profiling.profiled()
+def most_busy_user(index, selected_user="Overall"):
+    if isinstance(selected_user, MessageFilter):
+        index = index.query(selected_user)
+    counts = index.stats['messages'].drop("Overall").sort_values(ascending=False, kind='stable')
+    counts.index.name = 'user'
+    x = counts.head()
+    df = round((counts / index.stats.loc["Overall", 'messages'])*100, 2).reset_index().rename(columns={'user': "User", 'messages': "Percentage %"})
     return x, df
 
-def create_wordcloud(selected_user, df):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user]
-        
-    mask = np.array(Image.open("whatsapp.png"))
+@functools.lru_cache(maxsize=None)
+def load_mask(path="whatsapp.png"):
+    # decoded once per process instead of on every word cloud
+    from PIL import Image
+    return np.array(Image.open(path))
+
+@_filterable
+def create_wordcloud(selected_user, index):
+    # wordcloud is only needed once this section renders
+    from wordcloud import WordCloud
+
+    frequencies = index.counts(index.words, selected_user).nlargest(MAX_WORDS)
 
     # Generate the word cloud with transparent background
     wordcloud = WordCloud(
         width=200, 
         height=200, 
-        mask=mask, 
+        mask=load_mask(), 
         background_color=None,  # Transparent background
         mode='RGBA',  # Supports transparency in the image
-        max_words=1000, 
+        max_words=MAX_WORDS, 
         scale=3, 
         margin=1, 
         max_font_size=100
-    ).generate(''.join(df['clean_message']))
+    ).generate_from_frequencies(frequencies.to_dict())
     
     return wordcloud
 
-def start_end_date(selected_user, df):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user].reset_index(drop=True)
-    
-    # Get the first and last date from the DataFrame
-    first_date = df['msg_date'][0]
-    last_date = df['msg_date'].iloc[-1]
+@_filterable
+def start_end_date(selected_user, index):
+    # Get the first and last date and the number of active days
+    first_date, last_date, chatted_for_days = index.spans.loc[selected_user]
 
     # Helper function to add ordinal suffix to day
     def add_ordinal_suffix(day):
@@ -84,107 +411,54 @@ def start_end_date(selected_user, df):
     # Format the first and last date
     first_date = f"{first_date.strftime('%B')} {add_ordinal_suffix(first_date.day)}, {first_date.year}"
     last_date = f"{last_date.strftime('%B')} {add_ordinal_suffix(last_date.day)}, {last_date.year}"
-    chatted_for_days = len(df['date'].unique())
 
-    return first_date, last_date, chatted_for_days
+    return first_date, last_date, int(chatted_for_days)
 
 
-def monthly_timeline(selected_user ,df):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user]
-    timeline = df.groupby(['year', 'month_num', 'month']).count()['message'].reset_index()
-    time = []
-    for i in range(timeline.shape[0]):
-        time.append(timeline['month'][i] + "-" + str(timeline['year'][i]))
-
-    timeline['time'] = time
+@_filterable
+def monthly_timeline(selected_user, index):
+    timeline = index.counts(index.monthly, selected_user).rename('message').reset_index()
+    timeline['time'] = timeline['month'].astype(str) + "-" + timeline['year'].astype(str)
     return timeline
 
-def daily_timeline(selected_user ,df):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user]
-    daily_timeline = df.groupby('date').count()['message'].reset_index()
+@_filterable
+def daily_timeline(selected_user, index):
+    daily_timeline = index.counts(index.daily, selected_user).rename('message').reset_index()
     return daily_timeline
 
-def week_activity_map(selected_user, df):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user]
-    
-    return df['day_name'].value_counts()
-
-def month_activity_map(selected_user, df):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user]
-    
-    return df['month'].value_counts()
+@_filterable
+def week_activity_map(selected_user, index):
+    busy_day = index.weekday_hour[selected_user].sum(axis=1)
+    busy_day = busy_day[busy_day > 0]
+    return busy_day.sort_values(ascending=False, kind='stable').rename('count')
 
-def activity_heatmap(selected_user, df):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user]
-    
-    period = []
-    new_dff=df[['hour', 'minute', 'day_name', 'message']]
-    new_dff = new_dff.sort_values(by='hour').reset_index()
-
-    for hour in new_dff['hour']:
-        if hour == 23:
-            period.append("23-00")
-        elif hour == 0:
-            period.append("0-1")
-        else:
-            period.append(str(hour) + "-" + str(hour+1))
+@_filterable
+def month_activity_map(selected_user, index):
+    busy_month = index.counts(index.months, selected_user)
+    return busy_month.sort_values(ascending=False, kind='stable').rename('count')
 
-    new_dff['period'] = period
+@_filterable
+def activity_heatmap(selected_user, index):
+    user_heatmap = index.weekday_hour[selected_user]
+    # keep only weekdays and hours that have messages, then label hours with their period
+    user_heatmap = user_heatmap.loc[user_heatmap.sum(axis=1) > 0, user_heatmap.sum(axis=0) > 0]
+    periods = pd.Categorical.from_codes(user_heatmap.columns, categories=PERIODS, ordered=True)
+    return user_heatmap.set_axis(pd.CategoricalIndex(periods, name='period'), axis=1)
 
-    new_dff['period'] = pd.Categorical(new_dff['period'], categories=[
-        "0-1", "1-2", "2-3", "3-4", "4-5", "5-6", "6-7", "7-8", "8-9", "9-10", 
-        "10-11", "11-12", "12-13", "13-14", "14-15", "15-16", "16-17", "17-18", 
-        "18-19", "19-20", "20-21", "21-22", "22-23", "23-00"], ordered=True)
-    
-    user_heatmap = new_dff.pivot_table(index='day_name', columns='period', values='message', aggfunc='count').fillna(0)
-    return user_heatmap
-
-def emoji_helper(selected_user, df):
-    if selected_user != "Overall":
-        df = df[df['user'] == selected_user]
-    emojis = []
-    for e in df['emoji']:
-        if e != "":
-            emojis.extend(e)
-
-    messages_with_emoji = len(df[df['emoji'] != ""])
-    messages_without_emoji = len(df) - messages_with_emoji
+@_filterable
+def emoji_helper(selected_user, index):
+    messages_with_emoji = int(index.stats.loc[selected_user, 'emoji_messages'])
+    messages_without_emoji = int(index.stats.loc[selected_user, 'messages']) - messages_with_emoji
     sizes = [messages_with_emoji, messages_without_emoji]
-    
-    # sediment analysis of emoji
-    emoji_sentiment_dict = {
-    # Positive emojis
-    "😀": "positive", "😃": "positive", "😄": "positive", "😁": "positive", "😆": "positive", "😅": "positive",
-    "😂": "positive", "🤣": "positive", "😊": "positive", "😇": "positive", "😍": "positive", "😘": "positive",
-    "😚": "positive", "😋": "positive", "😜": "positive", "😎": "positive", "🤩": "positive", "🥳": "positive",
-    "🤗": "positive", "💖": "positive", "💓": "positive", "💕": "positive", "💞": "positive", "💝": "positive",
-    "💙": "positive", "💚": "positive", "💛": "positive", "💜": "positive", "❤️": "positive", "🧡": "positive",
-    "💗": "positive", "🎉": "positive", "🎊": "positive", "🥰": "positive", "😻": "positive", "👍": "positive",
-    "🙏": "positive", "✨": "positive", "🌟": "positive", "🥹": "positive", "🔥": "positive", "💪": "positive",
-    "🦄": "positive", "🌻": "positive", "🌼": "positive", "🥳": "positive", "🍀": "positive", "🎈": "positive",
-    "🍰": "positive", "💌": "positive", "🧁": "positive", "☀️": "positive", "🌊": "positive", "🥲": 'positive',
 
-    # Negative emojis
-    "😞": "negative", "😔": "negative", "😟": "negative", "😕": "negative", "🙁": "negative", "☹️": "negative",
-    "😣": "negative", "😖": "negative", "😫": "negative", "😩": "negative", "😭": "negative", "😢": "negative",
-    "😨": "negative", "😰": "negative", "😱": "negative", "😡": "negative", "😠": "negative", "🤬": "negative",
-    "👿": "negative", "😤": "negative", "😓": "negative", "🤒": "negative", "🤕": "negative", "🥵": "negative",
-    "🥶": "negative", "😳": "negative", "😖": "negative", "💔": "negative", "💀": "negative", "☠️": "negative",
-    "👎": "negative", "😵": "negative", "😧": "negative", "🤢": "negative", "🤮": "negative", "🤧": "negative",
-    "😬": "negative", "😱": "negative", "😵‍💫": "negative", "🥺": "negative", "😧": "negative", "🖤": "negative",
-    "💩": "negative", "😿": "negative", "😤": "negative"
-    }
+    # sentiment analysis of emoji
+    sentiment_count = index.emojis.sentiment_mix(selected_user)
 
-    
-    sentiment_count = {"positive": 0, "neutral": 0, "negative": 0}
-    for emoji in emojis:
-        sentiment = emoji_sentiment_dict.get(emoji, "neutral")  # Default to 'neutral' if not found
-        sentiment_count[sentiment] += 1
+    top_emojis, counts = index.emojis.top(selected_user, TOP_EMOJIS)
+    emoji_df = pd.DataFrame({0: top_emojis, 1: counts}) if len(counts) else pd.DataFrame()
+    return emoji_df, sizes, sentiment_count
 
-    emoji_df = pd.DataFrame(Counter(emojis).most_common(len(Counter(emojis))))[:51]
-    return emoji_df, sizes, sentiment_count
\ No newline at end of file
+@_filterable
+def sentiment_counts(selected_user, index):
+    counts = index.counts(index.sentiment, selected_user)
+    return counts.sort_values(ascending=False, kind='stable').rename('count')
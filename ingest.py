@@ -0,0 +1,204 @@
+import contextvars
+import functools
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import preprocessor, helper
+from cache import content_key
+
+MAX_CHATS = 8  # chat states kept per process
+MAX_BYTES = 512 * 1024 * 1024  # in-memory budget for the stored chats' frames
+UPLOAD_WORKERS = 4  # background threads parsing uploads, shared by all sessions so one large upload does not hold up the rest
+
+
+class ChatState:
+    # What the last ingest of a chat left behind: the parsed frame and its AnalysisIndex, how many
+    # bytes of the export they cover (offset) and the content hash of exactly those bytes (key)
+    def __init__(self, key, index, offset):
+        self.key = key
+        self.index = index
+        self.offset = offset
+
+    @property
+    def df(self):
+        return self.index.df
+
+
+def _stored_format(state):
+    # Export format of the chat already parsed, None for frames without the attrs
+    name = state.df.attrs.get("format")
+    return None if name is None else preprocessor.get_format(name)
+
+
+def _appendable(data, state):
+    # The new export must start with the bytes already parsed, and whatever follows
+    # has to begin with a new message of the same export format (not continue the last parsed one)
+    if state is None or len(data) < state.offset or content_key(data[:state.offset]) != state.key:
+        return False
+    tail = data[state.offset:]
+    if state.offset and data[state.offset - 1:state.offset] != b"\n" and not tail.lstrip(b"\r").startswith(b"\n"):
+        return False
+    for line in preprocessor.iter_lines(io.BytesIO(tail), errors="replace"):
+        if line.strip():
+            fmt = _stored_format(state)
+            formats = preprocessor.FORMATS if fmt is None else [fmt]
+            return any(fmt.header.match(line) for fmt in formats)
+    return True
+
+
+class Progress:
+    # How far an ingest got, written by the worker thread and polled by the script thread
+    def __init__(self, total_bytes):
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.messages = 0
+        self.stage = "Parsing"
+
+    def update(self, bytes_read, messages):
+        self.bytes_read = bytes_read
+        self.messages = messages
+
+    @property
+    def fraction(self):
+        return min(self.bytes_read / self.total_bytes, 1.0) if self.total_bytes else 1.0
+
+    def __str__(self):
+        return (f"{self.stage}: {self.bytes_read / 2**20:,.1f} of {self.total_bytes / 2**20:,.1f} MiB, "
+                f"{self.messages:,} messages")
+
+
+def ingest(data, state=None, parse=None, compact=True, progress=None, key=None):
+    # Parses a chat export, reusing `state` from an earlier export of the same chat when `data`
+    # only appends to it: just the new tail is parsed and merged into the existing aggregates.
+    # parse(data, key=key) -> (key, df) can replace the full parse, e.g. ParseCache.load.
+    # key is content_key(data) if the caller already has it
+    if key is None:
+        key = content_key(data)
+    if state is not None and state.key == key:
+        return state
+
+    if _appendable(data, state):
+        index = state.index
+        tail = data[state.offset:]
+        if tail.strip():  # _appendable made sure it starts with a message header
+            report = None
+            if progress is not None:
+                report = lambda read, messages: progress.update(state.offset + read, len(state.df) + messages)
+            # the tail alone may not tell day and month apart, so it is read like the rest of the chat
+            df = preprocessor.preprocess_file(io.BytesIO(tail), compact=compact, progress=report,
+                                              fmt=_stored_format(state), date_format=state.df.attrs.get("date_format"))
+            if not df.empty:
+                if progress is not None:
+                    progress.stage = "Indexing"
+                index = index.append(df)
+        return ChatState(key, index, len(data))
+
+    if parse is None:
+        report = None if progress is None else progress.update
+        df = preprocessor.preprocess_file(io.BytesIO(data), compact=compact, progress=report)
+    else:
+        _, df = parse(data, key=key)
+    if progress is not None:
+        progress.update(len(data), len(df))
+        progress.stage = "Indexing"
+    return ChatState(key, helper.AnalysisIndex(df), len(data))
+
+
+class ChatStore:
+    # Latest ChatState per chat name, so a re-export of the same group only parses what is new.
+    # Bounded by a chat count and, like ParseCache, by the deep memory usage of the frames it holds
+    # (appended frames are never seen by the cache). The least recently ingested chats go first
+    def __init__(self, max_chats=MAX_CHATS, max_bytes=MAX_BYTES):
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self._states = OrderedDict()  # name -> (state, size in bytes)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._states:
+                return None
+            self._states.move_to_end(name)
+            return self._states[name][0]
+
+    def ingest(self, name, data, parse=None, compact=True, progress=None, key=None):
+        with self._lock:
+            previous, size = self._states.get(name, (None, 0))
+        state = ingest(data, previous, parse, compact, progress, key)
+        if state is not previous:
+            size = int(state.df.memory_usage(deep=True).sum())
+        with self._lock:
+            if name in self._states:
+                self._size -= self._states.pop(name)[1]
+            if size > self.max_bytes:
+                return state  # larger than the whole budget, the next export is parsed in full
+            self._states[name] = (state, size)
+            self._size += size
+            while len(self._states) > self.max_chats or self._size > self.max_bytes:
+                _, (_, evicted) = self._states.popitem(last=False)
+                self._size -= evicted
+        return state
+
+
+class UploadJob:
+    def __init__(self, future, progress):
+        self.future = future
+        self.progress = progress
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        # the ChatState, or the exception the ingest raised
+        return self.future.result()
+
+
+class UploadWorker:
+    # Ingests uploads on background threads, so the script thread can keep redrawing a progress bar
+    # while a large export is parsed. Running jobs are keyed by chat name and content hash: a rerun
+    # while the chat is still parsing picks up the running job instead of starting another one.
+    # Finished jobs are dropped, their ChatState lives on in the store (and within its limits)
+    def __init__(self, store, max_workers=UPLOAD_WORKERS):
+        self.store = store
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name, data, parse=None, compact=True):
+        # parse(data, key=key, progress=progress) -> (key, df) replaces the full parse and should
+        # report to progress.update. The upload is hashed once here; a chat that is already in the
+        # store (e.g. on every rerun after its upload) comes back as a finished job without a thread
+        key = content_key(data)
+        with self._lock:
+            job = self._jobs.get((name, key))
+            if job is not None:
+                return job
+            progress = Progress(len(data))
+            state = self.store.get(name)
+            if state is not None and state.key == key:
+                progress.update(len(data), len(state.df))
+                future = Future()
+                future.set_result(state)
+                return UploadJob(future, progress)
+            if parse is not None:
+                parse = functools.partial(parse, progress=progress)
+            # the submitter's context goes along, so its profiling recorder sees the parse stages
+            context = contextvars.copy_context()
+            future = self._pool.submit(context.run, self.store.ingest, name, data, parse, compact, progress, key)
+            job = UploadJob(future, progress)
+            self._jobs[name, key] = job
+        # outside the lock: the callback runs right here if the job is already done
+        job.future.add_done_callback(lambda _: self._forget((name, key), job))
+        return job
+
+    def _forget(self, key, job):
+        with self._lock:
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._jobs)
@@ -1,67 +1,332 @@
+import codecs
+import importlib.util
+import io
+import itertools
+import os
 import re
 import pandas as pd
 import emoji
 
-def get_year_format(date_str):
-    date_part = date_str.split(',')[0].strip()
-    year = date_part.split('/')[-1]
-    if len(year) == 2:
-        return 'YY'
-    elif len(year) == 4:
-        return 'YYYY'
+import profiling
+
+CHUNK_SIZE = 1 << 20  # characters/bytes read per chunk when streaming an export
+
+SNIFF_SIZE = 16 * 1024  # characters looked at to pick the export format
+PARALLEL_CHUNK_BYTES = 32 * 1024 * 1024  # bytes of export per preprocess_parallel task
+PROGRESS_EVERY = 10_000  # messages parsed between progress callbacks
+
+# Date and time as WhatsApp writes them across locales: D/M/Y, M/D/Y or Y/M/D with "/", "." or "-",
+# 2 or 4 digit years, optional seconds and 12h clocks with or without a (narrow) space before
+# am/pm, which some locales write with dots ("10:15 p. m.")
+TIMESTAMP = (r"((?:\d{1,2}([/.-])\d{1,2}\2\d{2,4}|\d{4}([/.-])\d{1,2}\3\d{1,2}),?\s\d{1,2}:\d{2}(?::\d{2})?"
+             r"(?:[ \u202f\u00a0]?[AaPp]\.?[ \u202f\u00a0]?[Mm]\.?)?)")
+# Dotted am/pm, rewritten to "am"/"pm" before the timestamps are parsed with %p (spaces written as
+# the characters themselves, the column may be Arrow-backed and RE2 has no \u escapes)
+DOTTED_AMPM = r"([AaPp])\.[" + " \u202f\u00a0" + r"]?([Mm])\.?"
+
+class ExportFormat:
+    # One family of export headers; `header` matches the start of a message line and captures
+    # its timestamp in group 1. `media` matches a whole media message and `placeholders` the
+    # texts the app writes instead of content, which are dropped from clean_message (case-insensitive).
+    # `system` matches the text of system messages that the app attributes to a sender
+    def __init__(self, name, header, media, placeholders, system=None):
+        self.name = name
+        self.header = re.compile(header)
+        self.media = re.compile(media)
+        self.placeholders = placeholders
+        self.system = None if system is None else re.compile(system)
+
+# U+200E is written as the character itself: the media pattern also runs on pyarrow's RE2, which has no \u escapes
+IOS_MEDIA = "\u200e?" + r"(?:(?:image|video|audio|sticker|GIF|document|Contact card) omitted|<attached: [^>]*>)"
+IOS_DELETED = r"(?:this message was|you) deleted(?: this message)?\.?"
+
+FORMATS = [
+    # Android: "12/01/23, 10:15 - User: message", attachments are "<Media omitted>"
+    ExportFormat("android", TIMESTAMP + r"\s-\s", r"<Media omitted>",
+                 r"<media omitted>|<this message was edited>|this message was deleted|null"),
+    # iOS: "[12/01/23, 10:15:02] User: message", attachments are "\u200eimage omitted" and the like
+    # (documents put the file name first) and those lines start with U+200E. So do system messages,
+    # which iOS attributes to the group ("Group: \u200eAlice added Bob")
+    ExportFormat("ios", r"\u200e?\[" + TIMESTAMP + r"\]\s", r"(?:.*\s)?" + IOS_MEDIA,
+                 IOS_MEDIA + r"|<this message was edited>|" + IOS_DELETED + "|null|" + "\u200e",
+                 system="\u200e" + r"(?!(?:.*\s)?" + IOS_MEDIA + r"$|(?i:" + IOS_DELETED + r")$)"),
+]
+MESSAGE_START = FORMATS[0].header
+
+def get_format(name):
+    return next(fmt for fmt in FORMATS if fmt.name == name)
+# "User Name: message" -> sender is everything up to the first ": " on the header line
+USER_SPLIT = re.compile(r"(.+?):\s")
+
+def emoji_regex(emojis):
+    # Builds one alternation out of a character trie so multi-codepoint sequences ("❤️", "😵‍💫")
+    # are matched whole and longest-first, without trying every emoji at every position
+    trie = {}
+    for e in emojis:
+        if e[0].isascii():
+            continue
+        node = trie
+        for char in e:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        singles = []
+        branches = []
+        for char, child in sorted(node.items()):
+            if char == "":
+                continue
+            if list(child) == [""]:
+                singles.append(re.escape(char))
+            else:
+                branches.append(re.escape(char) + build(child))
+        if singles:
+            branches.append(singles[0] if len(singles) == 1 else "[" + "".join(singles) + "]")
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    # Apart from keycaps ("1️⃣", "#⃣") every emoji starts outside ASCII; the lookahead lets the
+    # regex engine skip plain text quickly, keycaps get their own branch
+    return r"(?=[^\x00-\x7f])(?:" + build(trie) + r")|[#*0-9]\ufe0f?\u20e3"
+
+EMOJI_PATTERN = re.compile(emoji_regex(emoji.EMOJI_DATA))
+# Everything dropped from clean_message: emojis, the format's placeholders and links
+NOISE_PATTERNS = {
+    fmt.name: re.compile(EMOJI_PATTERN.pattern + r"|(?i:" + fmt.placeholders + r")|http\S+|www\S+")
+    for fmt in FORMATS
+}
+
+def scan_messages(messages, fmt=FORMATS[0]):
+    # Vectorized replacement for the per-row extract_emojis/clean_message closures
+    emojis = messages.str.findall(EMOJI_PATTERN).str.join("")
+    cleaned = messages.str.replace(NOISE_PATTERNS[fmt.name], "", regex=True).str.replace(r"\s+", " ", regex=True).str.strip()
+    return emojis, cleaned
+
+def iter_lines(source, chunk_size=CHUNK_SIZE, errors="strict"):
+    # Accepts a path, a text file object or a binary file object (e.g. a Streamlit upload)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield from iter_lines(f, chunk_size, errors)
+        return
+
+    # utf-8-sig drops a byte order mark, which would otherwise stop the first header from matching
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors=errors)
+    pending = ""
+    first = True
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        if first:
+            chunk = chunk.removeprefix("\ufeff")  # text sources decoded without utf-8-sig
+            first = False
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line[:-1] if line.endswith("\r") else line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending[:-1] if pending.endswith("\r") else pending
+
+def sniff(lines):
+    # Picks the format whose header matches most of the sampled lines
+    scores = [sum(1 for line in lines if fmt.header.match(line)) for fmt in FORMATS]
+    if not any(scores) and any(line.strip() for line in lines):
+        raise ValueError("Unrecognized export format: no line looks like a WhatsApp message header.")
+    return FORMATS[scores.index(max(scores))]
+
+def datetime_format(dates):
+    # Explicit to_datetime format for the timestamps of one export. Day/month order is taken
+    # from the first timestamp that can only be read one way and defaults to day first.
+    # `dates` can be any iterable, it is only consumed up to that timestamp
+    dates = iter(dates)
+    first_date = next(dates, None)
+    if first_date is None:
+        raise ValueError("No messages found in the chat data.")
+    sample = re.match(r"(?:(\d{1,2})([/.-])(\d{1,2})[/.-](\d{2,4})|(\d{4})([/.-])\d{1,2}[/.-]\d{1,2})(,?\s)"
+                      r"(\d{1,2}:\d{2})(:\d{2})?([ \u202f\u00a0]?)([AaPp]\.?[ \u202f\u00a0]?[Mm]\.?)?", first_date)
+    if sample is None:
+        raise ValueError(f"Invalid date format in date: {first_date}")
+    _, sep, _, year, long_year, year_sep, date_sep, _, seconds, ampm_sep, ampm = sample.groups()
+
+    if long_year:  # year first is always followed by month and day
+        date_format = year_sep.join(["%Y", "%m", "%d"])
     else:
-        raise ValueError(f"Invalid year format in date: {date_str}")
+        day_first = True
+        for date in itertools.chain([first_date], dates):
+            first, second = date.split(sep, 2)[:2]
+            if int(first) > 12:
+                break
+            if int(second) > 12:
+                day_first = False
+                break
+        date_format = sep.join(["%d", "%m"] if day_first else ["%m", "%d"]) + sep + ("%y" if len(year) == 2 else "%Y")
+    time_format = ("%I" if ampm else "%H") + ":%M" + (":%S" if seconds else "") + (ampm_sep + "%p" if ampm else "")
+    return date_format + date_sep + time_format
 
-def preprocess(data):
-    # Remove newlines
-    data = data.replace("\n", "")
-    
-    # Regex for timestamps: DD/MM/YY or DD/MM/YYYY, with optional am/pm
-    pattern = r"\d{2}\/\d{2}\/(?:\d{2}|\d{4}),\s\d{1,2}:\d{2}(?:\u202f(?:am|pm))?\s\-"
-    messages = re.split(pattern, data)[1:]
-    dates = re.findall(pattern, data)
-    
-    users = []
-    messages_list = []
-    for message in messages:
-        entry = re.split(r"([\w\W]+?):\s", message, maxsplit=1)
-        if len(entry) > 1:  # User message
-            users.append(entry[1].strip().title())
-            messages_list.append(entry[2])
+def parse_lines(lines, header=MESSAGE_START, progress=None, system=None):
+    # Single pass over the export: a line starting with a timestamp opens a new message,
+    # every other line is a continuation of the current one (lines before the first header are dropped).
+    # Messages whose text matches `system` are group notifications whatever their sender.
+    # progress(messages) is called every PROGRESS_EVERY messages and once at the end
+    dates, users, messages = [], [], []
+    extra = []
+    for line in lines:
+        match = header.match(line)
+        if match is None:
+            if dates:
+                extra.append(line)
+            continue
+
+        if extra:
+            messages[-1] = "\n".join([messages[-1], *extra])
+            extra = []
+
+        if progress is not None and len(dates) % PROGRESS_EVERY == 0:
+            progress(len(dates))
+        rest = line[match.end():]
+        entry = USER_SPLIT.match(rest)
+        dates.append(match.group(1))
+        if entry and (system is None or not system.match(rest, entry.end())):  # User message
+            users.append(entry.group(1).strip().title())
+            messages.append(rest[entry.end():])
         else:  # Group notification
             users.append("group_notifications")
-            messages_list.append(entry[0])
-    
-    # Create DataFrame
-    df = pd.DataFrame({"msg_date": dates, "user": users, "message": messages_list})
-    
-    # Clean up timestamp format
-    df["msg_date"] = df["msg_date"].str.strip().str.replace(r"\s-\s*$", "", regex=True)
-    
-    # Determine year format from the first date
-    if not df.empty:
-        first_date = df['msg_date'].iloc[0]
-        year_format = get_year_format(first_date)
-    else:
+            messages.append(rest)
+
+    if extra:
+        messages[-1] = "\n".join([messages[-1], *extra])
+    if progress is not None:
+        progress(len(dates))
+    return dates, users, messages
+
+def _head(lines, size=SNIFF_SIZE):
+    # Yields lines until about `size` characters have been seen, leaving the rest of `lines` unread
+    for line in lines:
+        yield line
+        size -= len(line) + 1
+        if size <= 0:
+            return
+
+@profiling.profiled("parse", rows=lambda result: len(result[1]))
+def parse_export(lines, progress=None, fmt=None):
+    # Sniffs the format from the first SNIFF_SIZE characters (unless it is already known),
+    # then parses everything in one pass
+    lines = iter(lines)
+    if fmt is None:
+        head = list(_head(lines))
+        fmt = sniff(head)
+        lines = itertools.chain(head, lines)
+    return fmt, *parse_lines(lines, fmt.header, progress, fmt.system)
+
+def preprocess(data, compact=False):
+    return build_frame(*parse_export(iter_lines(io.StringIO(data))), compact=compact)
+
+def preprocess_file(source, chunk_size=CHUNK_SIZE, compact=False, errors="replace", progress=None,
+                    fmt=None, date_format=None):
+    # Streams the export from a path or file object instead of holding the decoded text in memory.
+    # Invalid UTF-8 bytes become U+FFFD by default; progress(bytes_read, messages) reports how far parsing got.
+    # fmt and date_format skip detection, e.g. for the new tail of an export parsed before
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return preprocess_file(f, chunk_size, compact, errors, progress, fmt, date_format)
+    report = None if progress is None else (lambda messages: progress(source.tell(), messages))
+    lines = iter_lines(source, chunk_size, errors)
+    return build_frame(*parse_export(lines, report, fmt), compact=compact, date_format=date_format)
+
+def sniff_file(path):
+    # Format and datetime format of an export on disk, read from its first lines
+    # (and only as far as needed to tell day and month apart)
+    fmt = sniff(list(_head(iter_lines(path, errors="replace"))))
+    timestamps = (match.group(1) for match in map(fmt.header.match, iter_lines(path, errors="replace")) if match)
+    return fmt, datetime_format(timestamps)
+
+def chunk_boundaries(path, header, chunk_bytes):
+    # Byte offsets that each start a message line, roughly chunk_bytes apart, so every chunk
+    # holds whole messages (continuation lines stay with the header they belong to)
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        target = chunk_bytes
+        while target < size:
+            f.seek(target)
+            f.readline()  # skip the partial line we landed in
+            while True:
+                position = f.tell()
+                line = f.readline()
+                if not line:
+                    position = size
+                    break
+                if header.match(line.decode("utf-8", errors="replace")):
+                    break
+            if position >= size:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+            target = position + chunk_bytes
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _preprocess_range(path, start, end, fmt_name, date_format, compact):
+    # Worker side of preprocess_parallel: reads and parses its own byte range of the file,
+    # so only the path and two offsets are sent to the process
+    fmt = get_format(fmt_name)
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = iter_lines(io.BytesIO(data), errors="replace")
+    return build_frame(fmt, *parse_lines(lines, fmt.header, system=fmt.system), compact=compact, date_format=date_format)
+
+@profiling.profiled(rows=len)
+def preprocess_parallel(path, workers=None, compact=False, chunk_bytes=PARALLEL_CHUNK_BYTES):
+    # Splits a large export at message boundaries and preprocesses the chunks in a process pool;
+    # the result has the same rows, in the same order, as preprocess_file(path)
+    workers = workers or os.cpu_count() or 1
+    fmt, date_format = sniff_file(path)
+    ranges = chunk_boundaries(path, fmt.header, chunk_bytes)
+    if workers == 1 or len(ranges) == 1:
+        return preprocess_file(path, compact=compact)
+
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        futures = [pool.submit(_preprocess_range, path, start, end, fmt.name, date_format, compact)
+                   for start, end in ranges]
+        frames = [future.result() for future in futures]
+
+    df = pd.concat(frames, ignore_index=True)
+    if compact:
+        df["user"] = df["user"].astype("category")
+    df.attrs = {
+        "format": fmt.name,
+        "date_format": date_format,
+        "dropped_rows": sum(frame.attrs["dropped_rows"] for frame in frames),
+    }
+    return df
+
+@profiling.profiled(rows=len)
+def build_frame(fmt, dates, users, messages, compact=False, date_format=None):
+    if date_format is None:
+        date_format = datetime_format(dates)
+    elif not dates:
         raise ValueError("No messages found in the chat data.")
+
+    # Create DataFrame
+    df = pd.DataFrame({"msg_date": dates, "user": users, "message": messages})
+    if "%p" in date_format and re.search(DOTTED_AMPM, dates[0]):
+        df['msg_date'] = df['msg_date'].str.replace(DOTTED_AMPM, r"\1\2", regex=True)
     
-    # Determine time format
-    if any('am' in date or 'pm' in date for date in df['msg_date']):
-        time_format = '%I:%M %p'
-    else:
-        time_format = '%H:%M'
-    
-    # Set the date format
-    if year_format == 'YY':
-        date_format = f'%d/%m/%y, {time_format}'
-    else:
-        date_format = f'%d/%m/%Y, {time_format}'
-    
-    # Parse the dates
-    df['msg_date'] = pd.to_datetime(df['msg_date'], format=date_format, errors='coerce')
+    # Parse the dates with the exact format of this export
+    with profiling.stage("parse_dates", rows=len(df)):
+        df['msg_date'] = pd.to_datetime(df['msg_date'], format=date_format, errors='coerce')
     
-    # Drop rows with invalid dates
+    # Drop rows with invalid dates, keeping count so callers can report them
+    total = len(df)
     df = df.dropna(subset=['msg_date']).reset_index(drop=True)
+    dropped_rows = total - len(df)
     
     # Derive date components
     df["year"] = df["msg_date"].dt.year
@@ -76,21 +341,39 @@ def preprocess(data):
     # Filter out group notifications
     df = df[df["user"] != "group_notifications"].reset_index(drop=True)
     
-    # Extract emojis
-    def extract_emojis(text):
-        return "".join(char for char in text if char in emoji.EMOJI_DATA)
-    
-    df["emoji"] = df["message"].apply(extract_emojis)
-    
-    # Clean messages
-    def clean_message(text):
-        cleaned_text = emoji.replace_emoji(text, replace="")
-        cleaned_text = re.sub(r"<media omitted>|<this message was edited>|this message was deleted|null", "", cleaned_text, flags=re.IGNORECASE)
-        cleaned_text = re.sub(r"http\S+|www\S+", "", cleaned_text)
-        cleaned_text = re.sub(r"\s+", " ", cleaned_text).strip()
-        return cleaned_text if cleaned_text else ""
-    
-    df["clean_message"] = df["message"].apply(clean_message)
+    # Extract emojis and clean messages over the whole column
+    with profiling.stage("scan_messages", rows=len(df)):
+        df["emoji"], df["clean_message"] = scan_messages(df["message"], fmt)
     df["is_empty_after_cleaning"] = df["clean_message"] == ""
 
+    if compact:
+        df = compact_frame(df)
+    df.attrs["format"] = fmt.name
+    df.attrs["date_format"] = date_format
+    df.attrs["dropped_rows"] = dropped_rows
+    return df
+
+MONTHS = ["January", "February", "March", "April", "May", "June",
+          "July", "August", "September", "October", "November", "December"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# Arrow-backed strings are used for the text columns when pyarrow is installed
+STRING_DTYPE = "string[pyarrow]" if importlib.util.find_spec("pyarrow") else None
+
+@profiling.profiled(rows=len)
+def compact_frame(df):
+    # Same columns and values in a much smaller layout: categoricals for the repeated labels,
+    # narrow ints for calendar fields, datetime64 dates and Arrow strings for the text
+    df = df.assign(
+        user=df["user"].astype("category"),
+        month=pd.Categorical(df["month"], categories=MONTHS, ordered=True),
+        day_name=pd.Categorical(df["day_name"], categories=DAYS, ordered=True),
+        year=df["year"].astype("int16"),
+        day=df["day"].astype("int8"),
+        hour=df["hour"].astype("int8"),
+        minute=df["minute"].astype("int8"),
+        month_num=df["month_num"].astype("int8"),
+        date=df["msg_date"].dt.normalize(),
+    )
+    if STRING_DTYPE is not None:
+        df = df.astype({"message": STRING_DTYPE, "clean_message": STRING_DTYPE, "emoji": STRING_DTYPE})
     return df
\ No newline at end of file
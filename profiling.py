@@ -0,0 +1,217 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import deque
+
+import pandas as pd
+
+ENV = "CHATSENSE_PROFILE"  # set to a file path to record every stage of the process there as JSON lines
+MAX_RECORDS = 10_000  # stage records kept in memory per recorder
+
+
+class Recorder:
+    # Collects stage records: in memory for a summary, and appended to `path` as JSON lines if given.
+    # Peak memory needs tracemalloc, which slows every allocation in the process down, so it is on
+    # for the process-wide recorder (enable()) and for dashboard sessions only if they ask (trace_memory())
+    def __init__(self, path=None, trace_memory=False, max_records=MAX_RECORDS):
+        self.path = path
+        self.trace_memory = trace_memory
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+            if self.path is not None:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def summary(self):
+        # Calls, total and slowest wall time, rows and largest peak memory per stage, slowest first
+        frame = pd.DataFrame(self.records(), columns=["stage", "seconds", "rows", "peak_bytes"])
+        table = frame.groupby("stage").agg(
+            calls=("seconds", "size"), seconds=("seconds", "sum"), slowest=("seconds", "max"),
+            rows=("rows", "sum"), peak_mib=("peak_bytes", "max"),
+        )
+        table["peak_mib"] = table["peak_mib"] / 2**20
+        return table.sort_values("seconds", ascending=False)
+
+    def to_jsonl(self):
+        return "".join(json.dumps(record) + "\n" for record in self.records())
+
+
+# Stages go to the recorder of the current context (a dashboard session, see use()) and to the
+# process-wide one (enable()). With neither, stage() hands out one shared no-op context and
+# profiled() functions call straight through
+_current = contextvars.ContextVar("profiling_recorder", default=None)
+_process = None
+_started_tracing = False
+_memory_recorders = weakref.WeakSet()  # session recorders tracing memory, dropped with their session
+_tracing_lock = threading.Lock()
+_local = threading.local()
+
+
+def use(recorder):
+    # Records the stages run in the current context (and contexts copied from it) into recorder;
+    # None stops that. Threads start with an empty context, so a Streamlit session calls this on every run
+    _current.set(recorder)
+
+
+def enable(path=None, trace_memory=True):
+    # Process-wide recording, e.g. for the CLI or a server started with CHATSENSE_PROFILE
+    global _process
+    with _tracing_lock:
+        _process = Recorder(path, trace_memory)
+        _sync_tracing()
+    return _process
+
+
+def disable():
+    global _process
+    with _tracing_lock:
+        _process = None
+        _sync_tracing()
+
+
+def trace_memory(recorder, on):
+    # Turns peak memory on or off for one recorder. tracemalloc is process-wide, so it runs while
+    # the process recorder or any session's recorder asks for it, and every session pays for it
+    recorder.trace_memory = on
+    with _tracing_lock:
+        if on:
+            _memory_recorders.add(recorder)
+        else:
+            _memory_recorders.discard(recorder)
+        _sync_tracing()
+
+
+def _sync_tracing():
+    # Starts or stops tracemalloc to match what the recorders ask for (never stopping it if someone
+    # else started it); called with _tracing_lock held
+    global _started_tracing
+    wanted = (_process is not None and _process.trace_memory) or len(_memory_recorders) > 0
+    if wanted and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+    elif not wanted and _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+
+
+def enabled():
+    return bool(_recorders())
+
+
+def _recorders():
+    session = _current.get()
+    if session is None:
+        return () if _process is None else (_process,)
+    return (session,) if _process is None or _process is session else (session, _process)
+
+
+class _Disabled:
+    rows = None
+
+    @property
+    def info(self):
+        return {}  # extra fields are dropped
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_DISABLED = _Disabled()
+
+
+class _Stage:
+    # One timed stage. Stages nest per thread; memory is the process-wide tracemalloc peak
+    # while the stage ran, relative to what was allocated when it started
+    def __init__(self, name, rows, recorders):
+        self.name = name
+        self.rows = rows
+        self.recorders = recorders
+        self.info = {}  # extra fields for the record, e.g. cache counters
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault("stack", [])
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+        self.child_peak = 0
+        self.memory = None
+        if tracemalloc.is_tracing() and any(recorder.trace_memory for recorder in self.recorders):
+            current, peak = tracemalloc.get_traced_memory()
+            # resetting the peak below would hide what the enclosing stage reached so far
+            if self.parent is not None:
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+            self.memory = current
+            tracemalloc.reset_peak()
+        self.started = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        peak_bytes = None
+        if self.memory is not None and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            peak_bytes = peak - self.memory
+            if self.parent is not None:
+                self.parent.child_peak = max(self.parent.child_peak, peak)
+        _local.stack.pop()
+        record = {
+            "stage": self.name, "seconds": seconds, "rows": self.rows, "peak_bytes": peak_bytes,
+            "started": self.started, "pid": os.getpid(), "thread": threading.current_thread().name,
+            "error": None if exc[0] is None else exc[0].__name__,
+            **self.info,
+        }
+        for recorder in self.recorders:
+            recorder.add(record)
+        return False
+
+
+def stage(name, rows=None):
+    # with stage("parse") as s: ...; s.rows = n   (rows can also be passed up front,
+    # other fields for the record go into s.info)
+    recorders = _recorders()
+    if not recorders:
+        return _DISABLED
+    return _Stage(name, rows, recorders)
+
+
+def profiled(name=None, rows=None):
+    # Decorator timing every call of a function as one stage; rows(result) gives the row count
+    def decorate(fn):
+        stage_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            recorders = _recorders()
+            if not recorders:
+                return fn(*args, **kwargs)
+            with _Stage(stage_name, None, recorders) as s:
+                result = fn(*args, **kwargs)
+                if rows is not None:
+                    s.rows = rows(result)
+            return result
+        return wrapper
+    return decorate
+
+
+if os.environ.get(ENV):
+    enable(os.environ[ENV])
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+
+class MessageFilter:
+    # Which messages a helper looks at: a set of users (None for everyone), a [start, end) time range
+    # and an hour-of-day window [first, last) that may wrap past midnight, e.g. hours=(22, 2).
+    # Any part left as None does not filter
+    def __init__(self, users=None, start=None, end=None, hours=None):
+        self.users = None if users is None else tuple(sorted(set(users)))
+        self.start = None if start is None else pd.Timestamp(start)
+        self.end = None if end is None else pd.Timestamp(end)
+        self.hours = None if hours is None else tuple(hours)
+
+    def _key(self):
+        return self.users, self.start, self.end, self.hours
+
+    def __eq__(self, other):
+        return isinstance(other, MessageFilter) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"MessageFilter(users={self.users}, start={self.start}, end={self.end}, hours={self.hours})"
+
+
+class TimeIndex:
+    # Messages in time order: times[k] is the k-th earliest timestamp and order[k] its row in the frame.
+    # by_user[code] lists the time-order positions of one user's messages, ascending, so the messages
+    # of a user in a time range are a single searchsorted slice of user_times[code]
+    def __init__(self, msg_date, hour, codes, num_users):
+        times = msg_date.to_numpy(dtype='datetime64[ns]').view('int64')
+        self.order = np.argsort(times, kind='stable')
+        self.times = times[self.order]
+        self.hours = np.asarray(hour)[self.order]
+        user_codes = np.asarray(codes, dtype='int64')[self.order]
+        positions = np.argsort(user_codes, kind='stable')
+        ends = np.cumsum(np.bincount(user_codes, minlength=num_users))
+        self.by_user = np.split(positions, ends[:-1])
+        self.user_times = [self.times[part] for part in self.by_user]
+
+    def select(self, flt, user_codes):
+        # frame rows (in frame order) matching the filter; user_codes maps names to codes
+        lo = np.iinfo('int64').min if flt.start is None else flt.start.as_unit('ns').value
+        hi = np.iinfo('int64').max if flt.end is None else flt.end.as_unit('ns').value
+        if flt.users is None:
+            first, last = np.searchsorted(self.times, [lo, hi])
+            positions = np.arange(first, last)
+        else:
+            parts = []
+            for name in flt.users:
+                code = user_codes[name]
+                first, last = np.searchsorted(self.user_times[code], [lo, hi])
+                parts.append(self.by_user[code][first:last])
+            positions = np.sort(np.concatenate(parts)) if parts else np.array([], dtype='int64')
+
+        if flt.hours is not None:
+            first, last = flt.hours
+            hours = self.hours[positions]
+            if first <= last:
+                positions = positions[(hours >= first) & (hours < last)]
+            else:
+                positions = positions[(hours >= first) | (hours < last)]
+        return np.sort(self.order[positions])
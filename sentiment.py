@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+PARALLEL_THRESHOLD = 20_000  # unique messages below this are scored in-process
+CHUNK_SIZE = 5_000  # unique messages per worker task
+
+# Set to skip the network entirely; the lexicon then has to be in nltk_data already
+# (NLTK_DATA can point at a bundled copy)
+OFFLINE_ENV = "CHATSENSE_OFFLINE"
+LEXICON = "sentiment/vader_lexicon.zip"
+
+_analyzer = None
+
+
+def ensure_lexicon():
+    # Checks the local nltk_data cache first so a cold start never waits on the network
+    import nltk
+
+    try:
+        nltk.data.find(LEXICON)
+    except LookupError:
+        if os.environ.get(OFFLINE_ENV) or not nltk.download('vader_lexicon', quiet=True):
+            raise LookupError("VADER lexicon not found; run nltk.download('vader_lexicon') or point NLTK_DATA at a copy")
+
+
+def _get_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        ensure_lexicon()
+        from nltk.sentiment.vader import SentimentIntensityAnalyzer
+        _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+
+def _score_chunk(texts):
+    sid = _get_analyzer()
+    return [sid.polarity_scores(text)['compound'] for text in texts]
+
+
+def polarity(messages, workers=None):
+    # VADER compound score per message. Identical texts ("ok", "haha", "<Media omitted>")
+    # are scored once and large chats fan their unique texts out over a process pool
+    codes, uniques = pd.factorize(messages)
+    uniques = list(uniques)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(uniques) < PARALLEL_THRESHOLD:
+        scores = _score_chunk(uniques)
+    else:
+        chunks = [uniques[i:i + CHUNK_SIZE] for i in range(0, len(uniques), CHUNK_SIZE)]
+        # fetch the lexicon once here, not from every worker into the same nltk_data at once
+        ensure_lexicon()
+        # spawn rather than fork: the Streamlit server process is multi-threaded
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            scores = [score for chunk in pool.map(_score_chunk, chunks) for score in chunk]
+
+    scores = np.asarray(scores, dtype='float64')
+    return pd.Series(scores[codes], index=messages.index, name='sentiment')
+
+
+def labels(scores):
+    return pd.Series(
+        np.select([scores > 0.05, scores < -0.05], ['Positive', 'Negative'], default='Neutral'),
+        index=scores.index, name='sentiment_label'
+    )